@@ -1,22 +1,133 @@
+from __future__ import annotations
+
 import argparse
 import logging
-from dataclasses import asdict
+import os
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, replace
+from itertools import chain, islice
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from tv_ass_process import SCRIPT_VERSION, Processor
 from tv_ass_process.config import ProcessingConfig, ConversionStrategy, OutputFormat, MergeStrategy
 
+# Modes and their modules are imported where they are used, to keep the start of a single-file run fast
+if TYPE_CHECKING:
+    from tv_ass_process.framing import Framing
+    from tv_ass_process.metrics import BatchMetrics, FileMetrics, FileMetricsHook
+    from tv_ass_process.profiling import StageProfiler, StageRecord
+
+DEFAULT_CONFIG_PATH = Path(__file__).parent / "config.yaml"
+STDIN_PATH = Path("-")
+
 
 def main():
-    parser = argparse.ArgumentParser(description=f"Tap {SCRIPT_VERSION} | TV ASS Processor")
-    parser.add_argument("--conf", type=Path, default=Path(__file__).parent / "config.yaml",
-                        help="Configuration file path")
-    parser.add_argument("path", nargs="+", type=Path, help="Input files/directories")
+    if sys.argv[1:2] == ["serve"]:
+        serve_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description=f"Tap {SCRIPT_VERSION} | TV ASS Processor",
+                                     epilog="Run 'Tap.py serve -h' for the long-running service mode")
+    parser.add_argument("--conf", type=Path, default=DEFAULT_CONFIG_PATH, help="Configuration file path")
+    parser.add_argument("path", nargs="+", type=Path, help="Input files/directories, - to read from stdin")
     parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="Reprocess files even if their output is up to date")
+    parser.add_argument("--profile", type=Path, metavar="OUT_JSON",
+                        help="Write per-stage timing, event counts and allocations to a JSON file")
+    parser.add_argument("--metrics", type=Path, metavar="OUT",
+                        help="Periodically write batch throughput metrics (Prometheus format if OUT ends in .prom, "
+                             "JSON otherwise)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, metavar="SECONDS",
+                        help="Seconds between metrics snapshots")
+    parser.add_argument("--recursive", action="store_true", help="Also search subdirectories for input files")
+    parser.add_argument("--max-depth", type=int, metavar="N",
+                        help="Search at most N levels of subdirectories (implies --recursive)")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help=f"Only process found files matching GLOB, can be repeated "
+                             "(default: *.ass)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", default=[],
+                        help="Skip found files and directories matching GLOB, can be repeated. "
+                             "Patterns containing / match the path relative to the given directory")
+    parser.add_argument("--prefetch", type=int, default=4, metavar="N",
+                        help="With one job, hash up to N files ahead for incremental processing and write "
+                             "outputs in the background (0 to disable)")
+    parser.add_argument("--stdout", action="store_true",
+                        help="Write the output to stdout instead of files, in the first output format "
+                             "(implied when reading from stdin)")
+    parser.add_argument("--framing", choices=("none", "nul", "length"), default="none",
+                        help="Separation of several documents on stdin and stdout: nul = NUL byte after each, "
+                             "length = line with the byte count before each")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep watching input directories and process new .ass files as they finish writing")
+    parser.add_argument("--settle-time", type=float, default=2.0, metavar="SECONDS",
+                        help="Seconds a watched file must stay unchanged before it is processed")
 
     add_config_arguments(parser)
     args = parser.parse_args()
 
+    config = load_config(args.conf, build_override_dict(args))
+    setup_logging(args.verbose, config)
+
+    if args.stdout or STDIN_PATH in args.path:
+        if not process_stdio(args.path, config, args.framing):
+            sys.exit(1)
+        return
+
+    metrics = None
+    if args.metrics:
+        from tv_ass_process.metrics import BatchMetrics
+
+        metrics = BatchMetrics(args.metrics, args.metrics_interval)
+        metrics.start()
+    try:
+        if args.watch:
+            watch_paths(args.path, config, args.jobs, incremental=not args.force, metrics=metrics,
+                        settle_time=args.settle_time)
+        else:
+            from tv_ass_process.discovery import DEFAULT_INCLUDE, iter_input_files
+
+            max_depth = args.max_depth if args.max_depth is not None else None if args.recursive else 0
+            files = iter_input_files(args.path, max_depth, args.include or DEFAULT_INCLUDE, args.exclude)
+            process_paths(files, config, args.jobs, incremental=not args.force, profile=args.profile,
+                          metrics=metrics, prefetch=args.prefetch)
+    finally:
+        if metrics is not None:
+            metrics.stop()
+
+
+def serve_main(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="Tap.py serve",
+                                     description=f"Tap {SCRIPT_VERSION} | Long-running processing service")
+    parser.add_argument("--conf", type=Path, default=DEFAULT_CONFIG_PATH,
+                        help="Configuration file path, reloaded when it changes")
+    parser.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--socket", type=Path, help="Listen on this Unix domain socket instead of TCP")
+
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from tv_ass_process.service import ProcessingService, serve
+
+    override_dict = build_override_dict(args)
+    service = ProcessingService(lambda: load_config(args.conf, override_dict), args.conf)
+    setup_logging(args.verbose, service.processor.config)
+    serve(service, args.host, args.port, args.socket)
+
+
+def load_config(path: Path, override: dict) -> ProcessingConfig:
+    config = ProcessingConfig.from_yaml_cached(path) if path.exists() else ProcessingConfig()
+    return merge_config(config, override)
+
+
+def setup_logging(verbose: bool, config: ProcessingConfig):
     logger = logging.getLogger("tv_ass_process")
     logger.setLevel(logging.DEBUG)
 
@@ -25,11 +136,7 @@ def main():
     console_handler.setFormatter(formatter)
     logger.addHandler(console_handler)
 
-    config = ProcessingConfig.from_yaml(args.conf) if args.conf.exists() else ProcessingConfig()
-    override_dict = build_override_dict(args)
-    config = merge_config(config, override_dict)
-
-    if args.verbose:
+    if verbose:
         console_handler.setLevel(logging.DEBUG)
         file_handler = logging.FileHandler("Tap.log", encoding="utf-8")
         file_handler.setLevel(logging.DEBUG)
@@ -39,8 +146,6 @@ def main():
     else:
         console_handler.setLevel(logging.WARNING)
 
-    process_paths(args.path, config)
-
 
 def add_boolean_pair(parser, flag: str, dest: str, help_text: str = ""):
     parser.add_argument(f"-{flag}", action="store_true", dest=dest, default=None,
@@ -66,8 +171,8 @@ def add_config_arguments(parser):
     )
     parser.add_argument(
         "-f", "--output-format",
-        type=OutputFormat, choices=list(OutputFormat),
-        help="Output file format (e.g., txt, srt, json)"
+        type=OutputFormat, choices=list(OutputFormat), action="append",
+        help="Output file format (e.g., txt, srt, json), can be repeated to write several formats"
     )
     parser.add_argument(
         "-e", "--output-ending",
@@ -135,6 +240,8 @@ def build_override_dict(args) -> dict:
 
     for arg_name, path in mapping.items():
         value = arg_dict.get(arg_name)
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
         if value is not None:
             current = override
             for key in path[:-1]:
@@ -145,43 +252,275 @@ def build_override_dict(args) -> dict:
 
 
 def merge_config(config: ProcessingConfig, override: dict) -> ProcessingConfig:
-    config_dict = asdict(config)
+    changes = {}
+    for k, v in override.items():
+        if isinstance(v, dict):
+            v = merge_config(getattr(config, k), v)
+        changes[k] = v
+    return replace(config, **changes)
 
-    def deep_merge(target, updates):
-        for k, v in updates.items():
-            if isinstance(v, dict):
-                node = target.setdefault(k, {})
-                deep_merge(node, v)
-            else:
-                target[k] = v
 
-    deep_merge(config_dict, override)
-    return ProcessingConfig.from_dict(config_dict)
+_worker_processor: Processor | None = None
+_worker_profiler: StageProfiler | None = None
+_worker_metrics: FileMetricsHook | None = None
 
 
-def get_all_files_from_dir(paths: Path) -> list[Path]:
-    return [path for path in paths.glob("*.ass")if path.is_file() and not path.stem.endswith("_processed")]
+def init_worker(config: ProcessingConfig, incremental: bool = False, profile: bool = False,
+                compact_manifests: bool = True):
+    from tv_ass_process.metrics import FileMetricsHook
 
+    global _worker_processor, _worker_profiler, _worker_metrics
+    _worker_processor = Processor(config, incremental)
+    _worker_processor.compact_manifests = compact_manifests
+    _worker_metrics = FileMetricsHook()
+    _worker_processor.add_hook(_worker_metrics)
+    if profile:
+        import tracemalloc
+        from tv_ass_process.profiling import StageProfiler
 
-def process_paths(paths: list[Path], config: ProcessingConfig):
-    processor = Processor(config)
-    files = sorted(set(p for path in paths for p in (get_all_files_from_dir(path) if path.is_dir() else [path])))
+        tracemalloc.start()
+        _worker_profiler = StageProfiler()
+        _worker_processor.add_hook(_worker_profiler)
+
+
+def init_watch_worker(config: ProcessingConfig, incremental: bool = False):
+    import signal
+
+    # Ctrl+C and SIGTERM reach the whole process group, the main process stops the pool and lets running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    init_worker(config, incremental, compact_manifests=False)
+
+
+def process_file(file: Path) -> tuple[FileMetrics, list[StageRecord]]:
+    start = time.perf_counter()
+    error = None
+    try:
+        _worker_processor(file)
+    except Exception as e:
+        error = e
+    return collect_file_results(file, time.perf_counter() - start, error)
 
-    total = len(files)
-    if total == 0:
+
+def process_files_pipelined(files: Iterable[Path],
+                            prefetch: int) -> Iterator[tuple[Path, FileMetrics, list[StageRecord]]]:
+    from tv_ass_process.pipeline import Pipeline
+
+    pipeline = Pipeline(_worker_processor, prefetch=prefetch, max_pending_writes=prefetch)
+    for result in pipeline.run(files):
+        yield result.path, *collect_file_results(result.path, result.seconds, result.error)
+
+
+def process_files_in_pool(executor, files: Iterable[Path],
+                          max_pending: int) -> Iterator[tuple[Path, FileMetrics, list[StageRecord]]]:
+    """Submit files as they are found, with at most `max_pending` in flight, and yield results in order"""
+    from collections import deque
+
+    pending = deque()
+    for file in files:
+        pending.append((file, executor.submit(process_file, file)))
+        if len(pending) >= max_pending:
+            file, future = pending.popleft()
+            yield file, *future.result()
+    for file, future in pending:
+        yield file, *future.result()
+
+
+def collect_file_results(file: Path, seconds: float,
+                         error: Exception | None = None) -> tuple[FileMetrics, list[StageRecord]]:
+    from tv_ass_process.metrics import FileMetrics
+
+    events, hashed, saved = _worker_metrics.pop(file)
+    metrics = FileMetrics(seconds)
+    if error is not None:
+        metrics.error = str(error)
+        metrics.error_type = type(error.__cause__ or error).__name__
+    else:
+        metrics.events = events
+        metrics.skipped = not saved
+        metrics.bytes_read = file.stat().st_size if saved or hashed else 0
+        if saved:
+            metrics.bytes_written = sum(output.stat().st_size for output in _worker_processor.output_paths(file))
+    return metrics, _worker_profiler.pop(file) if _worker_profiler else []
+
+
+def process_paths(files: Iterable[Path], config: ProcessingConfig, jobs: int = 1, incremental: bool = False,
+                  profile: Path | None = None, metrics: BatchMetrics | None = None, prefetch: int = 0):
+    files = iter(files)
+    first = list(islice(files, 2))
+    if not first:
         print("No files found to process.")
         return
+    files = chain(first, files)
+    initargs = (config, incremental, profile is not None)
+
+    if jobs <= 1 or len(first) == 1:
+        init_worker(*initargs)
+        files = check_outputs(files, _worker_processor)
+        if prefetch > 0 and len(first) > 1:
+            results = process_files_pipelined(files, prefetch)
+        else:
+            results = ((file, *process_file(file)) for file in files)
+        records = report_results(results, metrics, profile is not None)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        output_dirs = set()
+        files = check_outputs(files, Processor(config), output_dirs)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(*initargs, False)) as executor:
+            records = report_results(process_files_in_pool(executor, files, jobs * 4), metrics, profile is not None)
+        if incremental:
+            compact_manifests(output_dirs)
+
+    if profile is not None:
+        import json
+        from tv_ass_process.profiling import build_profile_report
+
+        with open(profile, "w", encoding="utf-8") as f:
+            json.dump(build_profile_report(records), f, ensure_ascii=False, indent=2)
 
-    total_files_width = len(str(total))
-    processed_count = 0
 
+def check_outputs(files: Iterable[Path], processor: Processor,
+                  output_dirs: set[Path] | None = None) -> Iterator[Path]:
+    """Pass the files through, adding the directories of their outputs to `output_dirs`.
+
+    With an output directory, files with the same name in different directories would overwrite each
+    other's outputs, so only the first of them is processed.
+    """
+    sources = {}
     for file in files:
-        processed_count += 1
-        print(f"\rProcessing: [{processed_count:0{total_files_width}}/{total}] {file.name}")
+        output_path = processor.output_path(file)
+        if processor.config.output.dir is not None:
+            source = sources.setdefault(output_path, file)
+            if source != file:
+                print(f"Failed: {file} has the same output as {source}: {output_path}")
+                continue
+        if output_dirs is not None:
+            output_dirs.add(output_path.parent)
+        yield file
+
+
+def compact_manifests(output_dirs: Iterable[Path]):
+    """Compact the manifests workers appended to, once none of them is running"""
+    from tv_ass_process.manifest import Manifest
+
+    for output_dir in output_dirs:
+        Manifest(output_dir)  # Compacted while loading if needed
+
+
+def iter_input_documents(paths: list[Path], framing: Framing) -> Iterator[tuple[str, bytes]]:
+    from tv_ass_process.discovery import iter_input_files
+    from tv_ass_process.framing import read_documents
+
+    for path in paths:
+        if path == STDIN_PATH:
+            for index, data in enumerate(read_documents(sys.stdin.buffer, framing), 1):
+                yield f"<stdin #{index}>", data
+        else:
+            for file in iter_input_files([path]):
+                yield str(file), file.read_bytes()
+
+
+def process_stdio(paths: list[Path], config: ProcessingConfig, framing: Framing | str = "none") -> bool:
+    """Process documents from files and stdin, writing the outputs to stdout.
+
+    A failed document still gets an empty frame, so outputs stay aligned with inputs.
+    Returns whether every document succeeded.
+    """
+    import io
+    from tv_ass_process.framing import Framing, write_document
+
+    framing = Framing(framing)
+    processor = Processor(config)
+    fmt = config.output.formats[0]
+    settings = config.output.for_format(fmt)
+    out = sys.stdout.buffer
+    succeeded = True
+    for name, data in iter_input_documents(paths, framing):
         try:
-            processor(file)
+            doc = processor.parse(data.decode("utf-8-sig"))
+            processor(doc)
         except Exception as e:
-            print(f"Failed: {e}")
+            print(f"Failed: {name}: {e}", file=sys.stderr)
+            succeeded = False
+            write_document(out, b"", framing)
+            continue
+        if framing == Framing.LENGTH:
+            write_document(out, doc.render(fmt, settings).encode("utf-8"), framing)
+        else:
+            text = io.TextIOWrapper(out, encoding="utf-8", newline="\n")
+            doc.write(text, fmt, settings)
+            text.flush()
+            text.detach()
+            write_document(out, b"", framing)
+    return succeeded
+
+
+def watch_paths(paths: list[Path], config: ProcessingConfig, jobs: int = 1, incremental: bool = False,
+                metrics: BatchMetrics | None = None, settle_time: float = 2.0):
+    from tv_ass_process.discovery import iter_input_files
+
+    directories = [path for path in paths if path.is_dir()]
+    files = [path for path in paths if not path.is_dir()]
+    if files:
+        process_paths(iter_input_files(files), config, jobs, incremental, metrics=metrics)
+    if not directories:
+        print("No directories to watch.")
+        return
+
+    processor = Processor(config)
+    output_dirs = set()
+
+    def report(file: Path, future):
+        output_dirs.add(processor.output_path(file).parent)
+        file_metrics, _ = future.result()
+        if file_metrics.error is not None:
+            print(f"Failed: {file_metrics.error}")
+        elif not file_metrics.skipped:
+            print(f"Processed: {file}")
+        if metrics is not None:
+            metrics.add(file_metrics)
+
+    import signal
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    from functools import partial
+    from tv_ass_process.watch import DirectoryWatcher
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Stop as on Ctrl+C
+    print(f"Watching: {', '.join(str(directory) for directory in directories)} (Ctrl+C to stop)")
+    watcher = DirectoryWatcher(directories, settle_time=settle_time)
+    jobs = max(1, jobs)
+    pending = set()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_watch_worker,
+                             initargs=(config, incremental)) as executor:
+        try:
+            for file in watcher:
+                if len(pending) >= jobs * 4:  # Stop taking files while the workers are behind
+                    pending = wait(pending, return_when=FIRST_COMPLETED).not_done
+                future = executor.submit(process_file, file)
+                future.add_done_callback(partial(report, file))
+                pending.add(future)
+        except KeyboardInterrupt:
+            print("Stopping, waiting for running jobs...")
+        finally:
+            watcher.stop()
+    if incremental:
+        compact_manifests(output_dirs)
+
+
+def report_results(results: Iterable[tuple[Path, FileMetrics, list[StageRecord]]],
+                   metrics: BatchMetrics | None = None, profile: bool = False) -> dict[str, list[StageRecord]]:
+    """Print the progress. Stage records are only kept with `profile`, so memory doesn't grow with the batch."""
+    records = {}
+    for processed_count, (file, file_metrics, stages) in enumerate(results, 1):
+        print(f"\rProcessing: [{processed_count}] {file.name}")
+        if file_metrics.error is not None:
+            print(f"Failed: {file_metrics.error}")
+        if metrics is not None:
+            metrics.add(file_metrics)
+        if profile:
+            records[str(file)] = stages
+    return records
 
 
 if __name__ == "__main__":
@@ -0,0 +1,91 @@
+"""Deterministic generator of Japanese TV style ASS subtitles.
+
+The output mimics subtitles extracted from TS recordings: colored speakers, \\pos tags,
+Rubi lines, gaiji, half-width kana, audio markers and interjections.
+"""
+import random
+
+__all__ = (
+    "generate_ass",
+)
+
+HEADER = (
+    "[Script Info]\n"
+    "ScriptType: v4.00+\n"
+    "PlayResX: 960\n"
+    "PlayResY: 540\n\n"
+    "[V4+ Styles]\n"
+    "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+    "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, "
+    "MarginR, MarginV, Encoding\n"
+    "Style: Default,MS UI Gothic,36,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,"
+    "10,10,10,1\n\n"
+    "[Events]\n"
+    "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+)
+
+SENTENCES = (
+    "お父さんがいっぱいだー！", "意味が分からない", "つまり えっと…", "姉は ﾖｼｭｱさんを流通用の段ﾎﾞｰﾙに",
+    "封印したってことでしょうか？", "今は楽しい歓迎会の場です", "あとで考えましょ", "お母さんは落ち着きすぎです！",
+    "それでは お父さんを入れて", "ｼｬｯﾌﾙｸｲｽﾞしたら面白そうです", "当てる自信ありです", "だとしても やめましょう",
+    "え～ でも", "今日は ＴＶで１００回目の放送です", "ＯＫ！ 行くぞ", "明日 ９時に駅前で", "本当に？！",
+    "ちょっと待って", "き… 君は誰だ？", "あ… 危ない！", "そんなことないよ", "ありがとう ございます",
+    "ｶﾞﾝﾊﾞﾚ！", "今度の日曜日 空いてる？", "３ヶ月ぶりだね", "何ですって！！", "ごめんなさい",
+)
+INTERJECTIONS = ("あっ", "えっ", "うわぁ", "ふふっ", "はぁ…", "うーん", "ん？", "ヒィー", "ほぅ", "わわわ")
+SPEAKERS = ("清子", "田中", "鈴木", "男性", "女性")
+COLORS = ("&H00ffff&", "&Hffff00&", "&H00ff00&", "&Hff80ff&")
+AUDIO_MARKERS = ("♪", "♪～", "📱", "≫")
+POSITIONS = ((340, 1018), (620, 898), (620, 1018), (940, 898), (420, 1018), (1060, 1018))
+GAIJI = "[外：0123456789ABCDEF0123456789ABCDEF]"
+
+
+def _timecode(ms: int) -> str:
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{ms // 10:02d}"
+
+
+def _text(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.12:
+        text = rng.choice(INTERJECTIONS) + " " + rng.choice(SENTENCES)
+    elif roll < 0.17:
+        text = rng.choice(INTERJECTIONS)
+    elif roll < 0.27:
+        text = f"({rng.choice(SPEAKERS)}){rng.choice(SENTENCES)}"
+    elif roll < 0.32:
+        text = f"{rng.choice(SPEAKERS)}：{rng.choice(SENTENCES)}"
+    elif roll < 0.37:
+        text = rng.choice(AUDIO_MARKERS) + rng.choice(SENTENCES)
+    elif roll < 0.40:
+        text = rng.choice(SENTENCES) + GAIJI
+    elif roll < 0.45:
+        text = "<" + rng.choice(SENTENCES) + ">"
+    else:
+        text = rng.choice(SENTENCES)
+    return text
+
+
+def generate_ass(events: int, seed: int = 0) -> str:
+    """Generate an ASS document with about `events` dialogue lines"""
+    rng = random.Random(seed)
+    lines = [HEADER]
+    time = 0
+    count = 0
+    while count < events:
+        duration = rng.randint(800, 5000)
+        start, end = _timecode(time), _timecode(time + duration)
+        color = rng.choice(COLORS) if rng.random() < 0.4 else None
+        for _ in range(min(rng.choice((1, 1, 2, 2, 3)), events - count)):
+            x, y = rng.choice(POSITIONS)
+            tags = f"\\pos({x},{y})" + (f"\\c{color}" if color else "")
+            lines.append(f"Dialogue: 0,{start},{end},Default,,0,0,0,,{{{tags}}}{_text(rng)}\\N\n")
+            count += 1
+            if count < events and rng.random() < 0.3:
+                lines.append(f"Dialogue: 0,{start},{end},Rubi,,0,0,0,,"
+                             f"{{\\pos({x},{y - 40})\\fscx50\\fscy50}}ふりがな\\N\n")
+                count += 1
+        time += duration + rng.choice((0, 0, 0, 300, 2500, 8000))
+    return "".join(lines)
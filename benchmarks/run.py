@@ -0,0 +1,137 @@
+"""Per-stage benchmarks of Tap.
+
+Usage (from the repository root):
+    python -m benchmarks.run [--sizes 100 1000 10000 100000] [--save-baseline benchmarks/baseline.json]
+    python -m benchmarks.run --baseline benchmarks/baseline.json [--threshold 0.2]
+
+Every stage reports events/sec, measured on the events it receives. With --baseline, stages slower
+than the baseline by more than the threshold are reported and the exit code is 1.
+"""
+import argparse
+import json
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from tv_ass_process import SCRIPT_VERSION, ProcessingConfig, Processor
+from tv_ass_process.subtitle import EventFilter
+from tv_ass_process.text_processing import (adjust_repeated_syllables, cjk_spacing, filter_interjections,
+                                            fix_western_text)
+from .corpus import generate_ass
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+
+CONFIG = {
+    "merge_strategy": "auto",
+    "cjk_spacing": {"enabled": True},
+    "mapping": {
+        "text": {"！！": "!!", "？！": "?!", "！？": "!?", "美味し": "おいし", "可愛い": "かわいい"},
+        "regex": {"(?<=\\d)[,，][ 　]?(?=\\d{3}([^\\d]|$))": "", "[ヶケヵカ](?=[月所])": "か"},
+    },
+}
+
+TEXT_FUNCTIONS: dict[str, Callable[[str], str]] = {
+    "text.filter_interjections": filter_interjections,
+    "text.cjk_spacing": cjk_spacing,
+    "text.adjust_repeated_syllables": adjust_repeated_syllables,
+    "text.fix_western_text": fix_western_text,
+}
+
+
+def timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_once(source: str, processor: Processor) -> dict[str, tuple[int, float]]:
+    """Time every stage once. Returns {stage: (events in, seconds)}"""
+    results = {}
+    doc = None
+
+    def parse():
+        nonlocal doc
+        doc = processor.parse(source)
+
+    results["parse"] = (source.count("\nDialogue:"), timed(parse))
+
+    texts = []
+    for name, stage in processor.stages():
+        if name == "postprocess":
+            texts = [event.text for event in doc.events]
+        count = len(doc.events)
+        results[f"stage.{name}"] = (count, timed(lambda: stage(doc)))
+
+    for name, func in TEXT_FUNCTIONS.items():
+        results[name] = (len(texts), timed(lambda: [func(text) for text in texts]))
+
+    output = processor.config.output
+    for fmt, render in (
+            ("txt", lambda: doc.to_txt(output.show_speaker, output.ending, 3)),
+            ("srt", lambda: doc.to_srt(output.show_speaker, output.ending)),
+            ("ass", lambda: doc.to_ass(output.show_speaker, output.ending)),
+    ):
+        results[f"write.{fmt}"] = (len(doc.events), timed(render))
+    return results
+
+
+def run(sizes: list[int], repeat: int, seed: int) -> dict[str, dict[str, float]]:
+    """Returns {size: {stage: events/sec}}, using the best of `repeat` runs"""
+    # Keep Rubi events while parsing, which a normal run drops, so stage.remove_rubi has work to time
+    processor = Processor(ProcessingConfig.from_dict(CONFIG), event_filter=EventFilter())
+    report = {}
+    for size in sizes:
+        source = generate_ass(size, seed)
+        best: dict[str, tuple[int, float]] = {}
+        for _ in range(repeat):
+            for stage, (count, seconds) in run_once(source, processor).items():
+                if stage not in best or seconds < best[stage][1]:
+                    best[stage] = (count, seconds)
+        report[str(size)] = {stage: count / max(seconds, 1e-9) for stage, (count, seconds) in best.items()}
+    return report
+
+
+def print_report(report: dict[str, dict[str, float]], baseline: dict | None, threshold: float) -> list[str]:
+    regressions = []
+    for size, stages in report.items():
+        print(f"\n{size} events")
+        for stage, rate in stages.items():
+            line = f"  {stage:<32}{rate:>14,.0f} events/s"
+            base = (baseline or {}).get(size, {}).get(stage)
+            if base:
+                change = rate / base - 1
+                line += f"  {change:+7.1%}"
+                if change < -threshold:
+                    line += "  REGRESSION"
+                    regressions.append(f"{size}/{stage}: {rate:,.0f} vs {base:,.0f} events/s")
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Tap {SCRIPT_VERSION} | Benchmarks")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="Event counts to test")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size, the best one is kept")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated corpus")
+    parser.add_argument("--baseline", type=Path, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown relative to the baseline (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", type=Path, help="Write the results as a new baseline")
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.repeat, args.seed)
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"] if args.baseline else None
+    regressions = print_report(report, baseline, args.threshold)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(
+            json.dumps({"version": SCRIPT_VERSION, "results": report}, indent=2), encoding="utf-8")
+
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
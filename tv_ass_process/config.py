@@ -1,8 +1,13 @@
+import hashlib
+import json
 import logging
-from dataclasses import dataclass, field, fields, is_dataclass
+import os
+from dataclasses import asdict, dataclass, field, fields, is_dataclass, replace
 from enum import Enum, StrEnum
 from pathlib import Path
 
+from .constants import SCRIPT_VERSION
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,14 +52,48 @@ class OutputFormat(StrEnum):
     ASS = "ass"
 
 
+@dataclass
+class FormatOverride:
+    """Output settings for a single format, None keeps the shared setting"""
+    ending: str | None = None
+    show_speaker: bool | None = None
+    show_pause_tip: int | None = None
+
+
 @dataclass
 class OutputSettings:
     """Configuration for output formatting"""
     dir: Path | None = None
-    format: OutputFormat = OutputFormat.TXT
+    format: OutputFormat | list[OutputFormat] = OutputFormat.TXT  # A list writes every format from one run
     ending: str = ""  # String appended to each sentence end
     show_speaker: bool = False
     show_pause_tip: int = 0
+    overrides: dict[OutputFormat, FormatOverride] = field(default_factory=dict)
+
+    def __post_init__(self):
+        if isinstance(self.format, (list, tuple)):
+            self.format = [OutputFormat(fmt) for fmt in self.format]
+            if not self.format:
+                raise ValueError("At least one output format is required")
+        else:
+            self.format = OutputFormat(self.format)
+        self.overrides = {
+            OutputFormat(fmt): override if isinstance(override, FormatOverride)
+            else dict_to_dataclass(FormatOverride, override or {})
+            for fmt, override in self.overrides.items()
+        }
+
+    @property
+    def formats(self) -> list[OutputFormat]:
+        return self.format if isinstance(self.format, list) else [self.format]
+
+    def for_format(self, fmt: OutputFormat | str) -> "OutputSettings":
+        """Settings of a single format, with its overrides applied"""
+        fmt = OutputFormat(fmt)
+        override = self.overrides.get(fmt)
+        changes = {f.name: value for f in fields(FormatOverride)
+                   if override is not None and (value := getattr(override, f.name)) is not None}
+        return replace(self, format=fmt, overrides={}, **changes)
 
 
 @dataclass
@@ -79,6 +118,14 @@ class RepetitionHandling:
     connector: str = "… "  # String to connect repeated syllables
 
 
+@dataclass
+class InterjectionLists:
+    """Entries added to the built-in interjection lists"""
+    words: list[str] = field(default_factory=list)  # Removed at the beginning and end of lines
+    single_words: list[str] = field(default_factory=list)  # Removed only if the whole line is interjections
+    patterns: list[str] = field(default_factory=list)  # Regex, must match the whole element
+
+
 @dataclass
 class Mapping:
     text: dict[str, str] = field(default_factory=dict)
@@ -89,6 +136,7 @@ class Mapping:
 class ProcessingConfig:
     merge_strategy: MergeStrategy = MergeStrategy.AUTO
     filter_interjections: bool = True
+    interjections: InterjectionLists = field(default_factory=InterjectionLists)
     output: OutputSettings = field(default_factory=OutputSettings)
     full_half_conversion: FullHalfConversion = field(default_factory=FullHalfConversion)
     cjk_spacing: CJKSpacing = field(default_factory=CJKSpacing)
@@ -106,3 +154,76 @@ class ProcessingConfig:
     @classmethod
     def from_dict(cls, data: dict) -> "ProcessingConfig":
         return dict_to_dataclass(cls, data)
+
+    @classmethod
+    def from_yaml_cached(cls, path: Path | str, encoding: str = "utf-8",
+                         cache_path: Path | str | None = None) -> "ProcessingConfig":
+        """Like from_yaml, but keeps the parsed config in a JSON cache next to the file.
+
+        The cache is used while the file's mtime is unchanged, or its content hash still matches,
+        so PyYAML is neither imported nor run on most starts. It only holds plain data, which is
+        rebuilt with from_dict like the YAML.
+        """
+        path = Path(path)
+        cache_path = Path(cache_path) if cache_path else path.with_name(f".{path.name}.cache")
+        stat = path.stat()
+        cached = _read_config_cache(cache_path)
+        if cached is not None and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+            return cached["config"]
+
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if cached is not None and cached["hash"] == digest:
+            config = cached["config"]
+        else:
+            import yaml
+
+            config = cls.from_dict(yaml.safe_load(data.decode(encoding)))
+        config_data = json.loads(json.dumps(asdict(config), default=str))
+        if cls.from_dict(config_data) != config:
+            return config  # Not representable as plain data, don't cache it
+        _write_config_cache(cache_path, {
+            "version": SCRIPT_VERSION,
+            "schema": config_schema(cls),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": digest,
+            "config": config_data,
+        })
+        return config
+
+
+def config_schema(cls) -> list:
+    """Field names and types of a config dataclass, so caches of older definitions are not reused"""
+    return [[f.name, config_schema(f.type) if is_dataclass(f.type) else str(f.type)] for f in fields(cls)]
+
+
+def _read_config_cache(cache_path: Path) -> dict | None:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable config cache {cache_path}: {e}")
+        return None
+    if (not isinstance(cached, dict) or cached.get("version") != SCRIPT_VERSION
+            or cached.get("schema") != config_schema(ProcessingConfig)):
+        return None
+    try:
+        cached["config"] = ProcessingConfig.from_dict(cached["config"])
+    except Exception as e:
+        logger.debug(f"Ignoring invalid config cache {cache_path}: {e}")
+        return None
+    return cached
+
+
+def _write_config_cache(cache_path: Path, cached: dict) -> None:
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cached, f, ensure_ascii=False)
+        tmp_path.replace(cache_path)
+    except OSError as e:
+        logger.debug(f"Could not write config cache {cache_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
@@ -0,0 +1,82 @@
+"""Finding input files under the paths given on the command line.
+
+Directories are walked with os.scandir and files are yielded as soon as they are found, so processing
+can start right away. Only directories are remembered, memory does not grow with the number of files.
+"""
+import logging
+import os
+from collections.abc import Iterable, Iterator, Sequence
+from fnmatch import fnmatch
+from pathlib import Path
+
+__all__ = (
+    "DEFAULT_INCLUDE",
+    "is_output_file",
+    "is_input_file",
+    "iter_input_files",
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INCLUDE = ("*.ass",)
+
+
+def is_output_file(path: Path) -> bool:
+    """Outputs of a previous run, never picked up as inputs"""
+    return path.stem.endswith("_processed")
+
+
+def is_input_file(path: Path) -> bool:
+    """ASS files that are not outputs of a previous run"""
+    return path.suffix == ".ass" and not is_output_file(path)
+
+
+def _matches(name: str, relative: str, patterns: Sequence[str]) -> bool:
+    """Patterns containing "/" match the path relative to the scanned root, others match the name"""
+    return any(fnmatch(relative if "/" in pattern else name, pattern) for pattern in patterns)
+
+
+def iter_input_files(paths: Iterable[Path | str], max_depth: int | None = 0,
+                     include: Sequence[str] = DEFAULT_INCLUDE, exclude: Sequence[str] = ()) -> Iterator[Path]:
+    """Yield the files given directly, once each, then input files found in the given directories.
+
+    Directories are scanned up to `max_depth` levels below them (None for no limit), in name order.
+    Found files must match `include` and not `exclude`; excluded directories are not entered.
+    Symlinked directories are not followed, and every directory is scanned once even if given twice.
+    """
+    paths = [Path(path) for path in paths]
+    given: set[str] = set()
+    for path in paths:
+        if not path.is_dir() and (key := os.path.abspath(path)) not in given:
+            given.add(key)
+            yield path
+    scanned: set[str] = set()
+    for root in paths:
+        if not root.is_dir():
+            continue
+        stack = [(str(root), "", 0)]
+        while stack:
+            directory, relative, depth = stack.pop()
+            real = os.path.realpath(directory)
+            if real in scanned:
+                continue
+            scanned.add(real)
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.warning(f"Cannot scan {directory}: {e}")
+                continue
+
+            subdirectories = []
+            for entry in entries:
+                entry_relative = relative + entry.name
+                if exclude and _matches(entry.name, entry_relative, exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if max_depth is None or depth < max_depth:
+                        subdirectories.append((entry.path, entry_relative + "/", depth + 1))
+                elif (entry.is_file() and _matches(entry.name, entry_relative, include)
+                      and not is_output_file(Path(entry.name)) and os.path.abspath(entry.path) not in given):
+                    yield Path(entry.path)
+            stack.extend(reversed(subdirectories))
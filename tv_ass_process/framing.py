@@ -0,0 +1,77 @@
+"""Several documents on one byte stream, for pipe mode.
+
+Framings:
+    none    The whole stream is one document
+    nul     Every document is followed by a NUL byte
+    length  Every document is preceded by its size in bytes, as a decimal number on its own line
+"""
+from collections.abc import Iterator
+from enum import StrEnum
+from typing import BinaryIO
+
+__all__ = (
+    "Framing",
+    "read_documents",
+    "write_document",
+)
+
+READ_SIZE = 1 << 16
+
+
+class Framing(StrEnum):
+    """Separation of documents on stdin/stdout"""
+    NONE = "none"
+    NUL = "nul"
+    LENGTH = "length"
+
+
+def read_documents(f: BinaryIO, framing: Framing) -> Iterator[bytes]:
+    """Yield documents as soon as they are complete, without waiting for the end of the stream"""
+    if framing == Framing.NONE:
+        yield f.read()
+    elif framing == Framing.NUL:
+        yield from _read_nul_separated(f)
+    elif framing == Framing.LENGTH:
+        yield from _read_length_prefixed(f)
+    else:
+        raise ValueError(f"Invalid framing: {framing}")
+
+
+def _read_nul_separated(f: BinaryIO) -> Iterator[bytes]:
+    read = getattr(f, "read1", f.read)  # read1 returns what is available instead of waiting for a full buffer
+    pending: list[bytes] = []  # Chunks of the unfinished document, only joined once it ends
+    while chunk := read(READ_SIZE):
+        start = 0
+        while (end := chunk.find(b"\0", start)) != -1:
+            pending.append(chunk[start:end])
+            yield b"".join(pending)
+            pending.clear()
+            start = end + 1
+        if start < len(chunk):
+            pending.append(chunk[start:])
+    last = b"".join(pending)
+    if last.strip():
+        yield last  # Last document without a terminator
+
+
+def _read_length_prefixed(f: BinaryIO) -> Iterator[bytes]:
+    while header := f.readline():
+        if not header.strip():
+            continue
+        try:
+            size = int(header)
+        except ValueError:
+            raise ValueError(f"Invalid length header: {header[:32]!r}") from None
+        data = f.read(size)
+        if len(data) != size:
+            raise ValueError(f"Stream ended after {len(data)} of {size} bytes")
+        yield data
+
+
+def write_document(f: BinaryIO, data: bytes, framing: Framing) -> None:
+    if framing == Framing.LENGTH:
+        f.write(b"%d\n" % len(data))
+    f.write(data)
+    if framing == Framing.NUL:
+        f.write(b"\0")
+    f.flush()
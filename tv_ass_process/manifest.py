@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .config import ProcessingConfig
+from .constants import SCRIPT_VERSION
+
+__all__ = (
+    "Manifest",
+    "ManifestEntry",
+    "hash_config",
+    "hash_bytes",
+    "hash_file",
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = ".tap_manifest.jsonl"
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: Path | str) -> str:
+    """Same as hash_bytes of the file's content, read in chunks"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def hash_config(config: ProcessingConfig) -> str:
+    payload = json.dumps([SCRIPT_VERSION, asdict(config)], sort_keys=True, default=str, ensure_ascii=False)
+    return hash_bytes(payload.encode("utf-8"))
+
+
+@dataclass
+class ManifestEntry:
+    input: str
+    input_hash: str
+    config_hash: str
+    output: str
+    size: int = -1
+    mtime_ns: int = -1
+
+
+class Manifest:
+    """Record of processed files stored in the output directory.
+
+    The manifest is an append-only JSON lines file, so several worker processes can record
+    results without rewriting each other's entries. Later lines override earlier ones.
+    With `compact`, a manifest with many overridden lines is rewritten when loaded. Workers running
+    next to each other must not compact, the rewrite would drop lines other workers append meanwhile.
+    """
+
+    def __init__(self, directory: Path | str, compact: bool = True):
+        self.path = Path(directory) / MANIFEST_FILENAME
+        self.entries: dict[str, ManifestEntry] = {}
+        self._loaded_lines = 0
+        if self.path.exists():
+            self._load()
+            if compact and self._loaded_lines > 2 * len(self.entries) + 64:
+                self.compact()
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._loaded_lines += 1
+                try:
+                    entry = ManifestEntry(**json.loads(line))
+                except (TypeError, ValueError):
+                    logger.warning(f"Ignoring malformed manifest line in {self.path}")
+                    continue
+                self.entries[entry.input] = entry
+
+    def compact(self) -> None:
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        tmp_path.replace(self.path)
+        self._loaded_lines = len(self.entries)
+
+    @staticmethod
+    def key(path: Path) -> str:
+        return str(path.resolve())
+
+    def is_unchanged(self, input_path: Path, config_hash: str, output_path: Path) -> bool:
+        """Cheap check based on file size and modification time, without reading the input."""
+        entry = self.entries.get(self.key(input_path))
+        if entry is None or entry.config_hash != config_hash or entry.output != self.key(output_path):
+            return False
+        stat = input_path.stat()
+        return entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns and output_path.exists()
+
+    def is_up_to_date(self, input_path: Path, input_hash: str, config_hash: str, output_path: Path) -> bool:
+        entry = self.entries.get(self.key(input_path))
+        return (entry is not None
+                and entry.input_hash == input_hash
+                and entry.config_hash == config_hash
+                and entry.output == self.key(output_path)
+                and output_path.exists())
+
+    def record(self, input_path: Path, input_hash: str, config_hash: str, output_path: Path) -> None:
+        stat = input_path.stat()
+        entry = ManifestEntry(self.key(input_path), input_hash, config_hash, self.key(output_path),
+                              stat.st_size, stat.st_mtime_ns)
+        self.entries[entry.input] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A single short append is effectively atomic, so concurrent workers don't interleave lines
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(asdict(entry), ensure_ascii=False) + "\n")
+        self._loaded_lines += 1
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from .profiling import StageHook
+from .subtitle import Subtitle
+
+__all__ = (
+    "FileMetrics",
+    "FileMetricsHook",
+    "BatchMetrics",
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FileMetrics:
+    seconds: float
+    events: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    skipped: bool = False  # Output was already up to date
+    error: str | None = None
+    error_type: str | None = None
+
+
+class FileMetricsHook(StageHook):
+    """Tracks the loaded events, whether the input was hashed and whether the output was saved, per file"""
+
+    def __init__(self):
+        self.files: dict[str, list] = {}  # path: [events, hashed, saved]
+        self._current: list | None = None
+
+    def file_started(self, path: Path) -> None:
+        self._current = self.files[str(path)] = [0, False, False]
+
+    def file_finished(self, path: Path) -> None:
+        self._current = None
+
+    def stage_finished(self, stage: str, doc: Subtitle | None) -> None:
+        if self._current is None:
+            return
+        if stage == "load" and doc is not None:
+            self._current[0] = len(doc.events)
+        elif stage == "read":
+            self._current[1] = True
+        elif stage == "save":
+            self._current[2] = True
+
+    def pop(self, path: Path | str) -> tuple[int, bool, bool]:
+        """(events, hashed, saved) of a finished file"""
+        events, hashed, saved = self.files.pop(str(path), (0, False, False))
+        return events, hashed, saved
+
+
+def _quantile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class BatchMetrics:
+    """Aggregated throughput of a batch, periodically written as JSON or Prometheus textfile format.
+
+    The format is chosen by the suffix of the output path: `.prom` for Prometheus, JSON otherwise.
+    Snapshots are written to a temporary file and renamed, so readers never see partial files.
+    Between `start` and `stop`, a background thread writes a snapshot every `interval` seconds,
+    also while no file finishes. Latency quantiles are estimated from a fixed-size random sample.
+    """
+
+    def __init__(self, path: Path | str, interval: float = 10.0, sample_size: int = 4096):
+        self.path = Path(path)
+        self.interval = interval
+        self.started = time.monotonic()
+        self.files = 0
+        self.skipped = 0
+        self.events = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.failures: Counter[str] = Counter()
+        self.latency_sum = 0.0
+        self.latencies: list[float] = []  # Reservoir sample of at most `sample_size` latencies
+        self.sample_size = sample_size
+        import random  # Only loaded with --metrics
+
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, metrics: FileMetrics) -> None:
+        with self._lock:
+            self.files += 1
+            self.skipped += metrics.skipped
+            self.events += metrics.events
+            self.bytes_read += metrics.bytes_read
+            self.bytes_written += metrics.bytes_written
+            if metrics.error_type is not None:
+                self.failures[metrics.error_type] += 1
+            self.latency_sum += metrics.seconds
+            if len(self.latencies) < self.sample_size:
+                self.latencies.append(metrics.seconds)
+            elif (index := self._random.randrange(self.files)) < self.sample_size:
+                self.latencies[index] = metrics.seconds
+
+    def start(self) -> None:
+        """Write snapshots every `interval` seconds from a background thread"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="tap-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread and write a final snapshot"""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning(f"Cannot write metrics to {self.path}: {e}")
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            "elapsed_seconds": elapsed,
+            "files": self.files,
+            "files_skipped": self.skipped,
+            "files_failed": sum(self.failures.values()),
+            "failures_by_type": dict(self.failures),
+            "events": self.events,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "files_per_second": self.files / elapsed if elapsed else 0.0,
+            "events_per_second": self.events / elapsed if elapsed else 0.0,
+            "latency_p50_seconds": _quantile(latencies, 0.5),
+            "latency_p99_seconds": _quantile(latencies, 0.99),
+            "timestamp": time.time(),
+        }
+
+    def to_prometheus(self, snapshot: dict) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list[tuple[str, float]]):
+            lines.append(f"# HELP tap_{name} {help_text}")
+            lines.append(f"# TYPE tap_{name} {kind}")
+            lines.extend(f"tap_{name}{labels} {value}" for labels, value in samples)
+
+        metric("files_total", "counter", "Files handled in this batch", [("", snapshot["files"])])
+        metric("files_skipped_total", "counter", "Files skipped as up to date", [("", snapshot["files_skipped"])])
+        metric("files_failed_total", "counter", "Failed files by exception type",
+               [(f'{{exception="{name}"}}', count) for name, count in sorted(self.failures.items())])
+        metric("events_total", "counter", "Dialogue events loaded", [("", snapshot["events"])])
+        metric("read_bytes_total", "counter", "Bytes of input read", [("", snapshot["bytes_read"])])
+        metric("written_bytes_total", "counter", "Bytes of output written", [("", snapshot["bytes_written"])])
+        metric("files_per_second", "gauge", "Average files per second", [("", snapshot["files_per_second"])])
+        metric("events_per_second", "gauge", "Average events per second", [("", snapshot["events_per_second"])])
+        metric("file_latency_seconds", "summary", "Per-file processing time", [
+            ('{quantile="0.5"}', snapshot["latency_p50_seconds"]),
+            ('{quantile="0.99"}', snapshot["latency_p99_seconds"]),
+            ("_sum", self.latency_sum),
+            ("_count", self.files),
+        ])
+        metric("batch_elapsed_seconds", "gauge", "Time since the batch started", [("", snapshot["elapsed_seconds"])])
+        metric("last_update_timestamp_seconds", "gauge", "Time of this snapshot", [("", snapshot["timestamp"])])
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        with self._lock:
+            snapshot = self.snapshot()
+            if self.path.suffix == ".prom":
+                text = self.to_prometheus(snapshot)
+            else:
+                text = json.dumps(snapshot, ensure_ascii=False, indent=2)
+            tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            tmp_path.replace(self.path)
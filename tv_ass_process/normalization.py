@@ -0,0 +1,205 @@
+import logging
+import re
+from collections.abc import Callable, Iterable, Mapping as MappingType
+from dataclasses import dataclass
+from functools import partial
+from operator import methodcaller
+
+from .subtitle import Events
+
+__all__ = (
+    "EMPTY_TEXTS",
+    "BulkStep",
+    "NormalizationPlan",
+    "compose_translations",
+    "drop_empty",
+    "compile_text_mapping",
+    "build_mapping_step",
+)
+
+logger = logging.getLogger(__name__)
+
+EMPTY_TEXTS = ("", "～")
+
+# A step either transforms the text, or returns None to drop the event
+Step = Callable[[str], str | None]
+
+
+@dataclass(frozen=True)
+class BulkStep:
+    """A step transforming the texts of all events at once, for transforms faster over the whole document.
+
+    `transform` returns as many texts as it is given, so it can't drop events.
+    """
+    transform: Callable[[list[str]], list[str]]
+
+
+def compose_translations(*tables: MappingType[int, int | str | None]) -> dict[int, str]:
+    """Merge translation tables into one, equivalent to applying them with str.translate in order."""
+    composed = {}
+    for key in set().union(*tables):
+        value = chr(key)
+        for table in tables:
+            value = value.translate(table)
+        if value != chr(key):
+            composed[key] = value
+    return composed
+
+
+def drop_empty(step: Callable[[str], str]) -> Step:
+    def wrapper(text: str) -> str | None:
+        text = step(text)
+        return None if text in EMPTY_TEXTS else text
+
+    return wrapper
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """Whether an occurrence of `a` and an occurrence of `b` can share characters"""
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
+
+def _interferes(earlier: tuple[str, str], later_key: str) -> bool:
+    """Whether applying the earlier replacement first can change where `later_key` matches"""
+    key, value = earlier
+    if _overlaps(key, later_key):
+        return True
+    if value:
+        return _overlaps(value, later_key)
+    # Deleting text can join its neighbours into a new match
+    return len(later_key) > 1
+
+
+def _trie_pattern(keys: Iterable[str]) -> str:
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        optional = "" in node
+        if len(alternatives) == 1 and not optional:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")" + ("?" if optional else "")
+
+    return build(trie)
+
+
+def compile_text_mapping(text_mapping: MappingType[str, str]) -> list[Callable[[str], str]]:
+    """Compile literal replacements into as few single-pass matchers as possible.
+
+    The rules are applied in order, like a chain of str.replace calls. Consecutive rules are grouped
+    into one trie-shaped regex as long as none of them can affect where a later one in the group
+    matches, so the result is identical to replacing one by one.
+    """
+    batches: list[list[tuple[str, str]]] = []
+    for key, value in text_mapping.items():
+        if (batches and key and batches[-1][0][0]
+                and not any(_interferes(rule, key) for rule in batches[-1])):
+            batches[-1].append((key, value))
+        else:
+            batches.append([(key, value)])
+
+    steps = []
+    for batch in batches:
+        if len(batch) == 1:
+            steps.append(methodcaller("replace", *batch[0]))
+            continue
+        table = dict(batch)
+        pattern = re.compile(_trie_pattern(table))
+        steps.append(partial(pattern.sub, lambda m, table=table: table[m[0]]))
+    return steps
+
+
+def build_mapping_step(text_mapping: MappingType[str, str], regex_mapping: MappingType[str, str]) -> Step | None:
+    steps = compile_text_mapping(text_mapping)
+    steps += [partial(re.compile(pattern).sub, replacement) for pattern, replacement in regex_mapping.items()]
+    if not steps:
+        return None
+    if len(steps) == 1:
+        return steps[0]
+
+    def apply_mapping(text: str) -> str:
+        for step in steps:
+            text = step(text)
+        return text
+
+    return apply_mapping
+
+
+class NormalizationPlan:
+    """Stateless text transforms, applied to all events in one traversal per run of per-event steps.
+
+    Steps are callables taking and returning the text, translation tables for str.translate, or
+    BulkSteps, which split the plan into traversals. Adjacent translation tables are merged into one
+    when the plan is built.
+    """
+
+    def __init__(self, steps: Iterable[Step | BulkStep | MappingType[int, int | str | None]] = ()):
+        self.steps: list[Step | BulkStep] = []
+        pending_tables = []
+        for step in steps:
+            if isinstance(step, MappingType):
+                pending_tables.append(step)
+                continue
+            self._flush_tables(pending_tables)
+            self.steps.append(step)
+        self._flush_tables(pending_tables)
+        # Runs of per-event steps, and the bulk steps between them
+        self._segments: list[list[Step] | BulkStep] = []
+        for step in self.steps:
+            if isinstance(step, BulkStep):
+                self._segments.append(step)
+            elif self._segments and isinstance(self._segments[-1], list):
+                self._segments[-1].append(step)
+            else:
+                self._segments.append([step])
+
+    def _flush_tables(self, tables: list) -> None:
+        if tables:
+            composed = compose_translations(*tables)
+            if composed:
+                self.steps.append(methodcaller("translate", composed))
+            tables.clear()
+
+    def __call__(self, text: str) -> str | None:
+        for step in self.steps:
+            text = step.transform([text])[0] if isinstance(step, BulkStep) else step(text)
+            if text is None:
+                return None
+        return text
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def apply(self, events: Events) -> Events:
+        """Run the plan over every event. Returns the events that were not dropped."""
+        kept = events
+        for segment in self._segments:
+            if isinstance(segment, BulkStep):
+                for event, text in zip(kept, segment.transform([event.text for event in kept])):
+                    event.text = text
+            else:
+                kept = self._apply_steps(segment, kept)
+        return kept if len(kept) != len(events) else events
+
+    @staticmethod
+    def _apply_steps(steps: list[Step], events: Events) -> Events:
+        kept = Events()
+        for event in events:
+            text = event.text
+            for step in steps:
+                text = step(text)
+                if text is None:
+                    break
+            else:
+                event.text = text
+                kept.append(event)
+        return kept
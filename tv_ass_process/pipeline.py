@@ -0,0 +1,135 @@
+"""Overlapping file I/O with processing, for inputs and outputs on slow storage.
+
+While the calling thread processes one document, I/O threads hash the next inputs and write the
+finished outputs. Hashes are only needed for incremental processing; computing them reads the inputs
+in chunks, which also brings them into the OS cache without keeping them in memory. The calling thread
+then loads them line by line.
+Hooks of the Processor are still called from the calling thread, one file at a time.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .manifest import hash_file
+from .processor import Processor
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+__all__ = (
+    "PipelineResult",
+    "Pipeline",
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineResult:
+    path: Path
+    seconds: float  # From the start of processing until the output was written
+    skipped: bool = False  # Output was already up to date
+    error: Exception | None = None  # Wrapped like the errors of Processor.__call__
+
+
+class Pipeline:
+    """Runs a Processor over many files with hashes ahead and writes behind.
+
+    With incremental processing, at most `prefetch` inputs are checked against the manifest and hashed
+    ahead; nothing is read ahead otherwise. At most `max_pending_writes` processed documents wait to be
+    written. When either limit is reached, the calling thread waits for the I/O. Inputs themselves are
+    never held in memory before processing. Results are yielded in input order once the output has
+    been written.
+    """
+
+    def __init__(self, processor: Processor, prefetch: int = 4, max_pending_writes: int = 4, io_threads: int = 4):
+        self.processor = processor
+        self.prefetch = max(1, prefetch)
+        self.max_pending_writes = max(1, max_pending_writes)
+        self.io_threads = max(1, io_threads)
+
+    def run(self, paths: Iterable[Path | str]) -> Iterator[PipelineResult]:
+        from concurrent.futures import ThreadPoolExecutor  # Not loaded until a batch needs it
+
+        paths = iter(paths)
+        reads: deque[tuple[Path, bool, Future[str] | None]] = deque()  # (path, up to date, input hash)
+        writes: deque[tuple[PipelineResult, Future[None] | None]] = deque()
+
+        with ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="tap-io") as io:
+            def fill_reads():
+                while len(reads) < self.prefetch:
+                    path = next(paths, None)
+                    if path is None:
+                        return
+                    path = Path(path)
+                    # Checked here, so I/O threads only read manifests, and skipped files are never hashed
+                    try:
+                        unchanged = self.processor.is_unchanged(path)
+                    except OSError:
+                        unchanged = False  # Reported by the read
+                    hashing = self.processor.incremental and not unchanged
+                    reads.append((path, unchanged, io.submit(hash_file, path) if hashing else None))
+
+            fill_reads()
+            while reads:
+                path, unchanged, read = reads.popleft()
+                fill_reads()
+                writes.append(self._process(io, path, unchanged, read))
+                while len(writes) > self.max_pending_writes:
+                    yield self._finish(*writes.popleft())
+                while writes and (writes[0][1] is None or writes[0][1].done()):
+                    yield self._finish(*writes.popleft())
+            while writes:
+                yield self._finish(*writes.popleft())
+
+    def _process(self, io: ThreadPoolExecutor, path: Path, unchanged: bool,
+                 read: Future[str] | None) -> tuple[PipelineResult, Future[None] | None]:
+        processor = self.processor
+        started = time.perf_counter()
+        result = PipelineResult(path, 0.0)
+
+        def finished(_=None):
+            result.seconds = time.perf_counter() - started
+
+        logger.info(f"Starting processing {path}")
+        for hook in processor.hooks:
+            hook.file_started(path)
+        try:
+            if unchanged:
+                logger.info(f"Skipped {path}, output is up to date")
+                result.skipped = True
+            else:
+                input_hash = processor.run_stage("read", lambda _: read.result()) if read is not None else None
+                doc = processor.prepare_file(path, input_hash)
+                if doc is None:
+                    result.skipped = True
+                else:
+                    # The save stage only hands the document over, an I/O thread streams it to the outputs
+                    write = processor.run_stage(
+                        "save", lambda d: io.submit(processor.write_output, path, d, input_hash), doc)
+                    write.add_done_callback(finished)
+                    return result, write
+        except Exception as e:
+            result.error = e
+        finally:
+            for hook in reversed(processor.hooks):
+                hook.file_finished(path)
+        finished()
+        return result, None
+
+    @staticmethod
+    def _finish(result: PipelineResult, write: Future[None] | None) -> PipelineResult:
+        if write is not None and write.exception() is not None:
+            result.error = write.exception()
+        if result.error is not None:
+            logger.error(f"Error processing file {result.path}: {result.error}")
+            error = ValueError(f"Error processing file {result.path}: {result.error}")
+            error.__cause__ = result.error
+            result.error = error
+        return result
@@ -1,15 +1,23 @@
 import logging
 from collections import defaultdict
+from collections.abc import Callable
+from functools import partial
 from pathlib import Path
-from typing import overload, Sequence
-
-from .config import ProcessingConfig, MergeStrategy, FullHalfConversion
-from .subtitle import Subtitle, Events
+from typing import overload, Sequence, TypeVar
+
+from .config import ProcessingConfig, MergeStrategy, FullHalfConversion, OutputFormat
+from .manifest import Manifest, hash_bytes, hash_config, hash_file
+from .normalization import EMPTY_TEXTS, BulkStep, NormalizationPlan, build_mapping_step, drop_empty
+from .profiling import StageHook
+from .subtitle import Subtitle, EventFilter
+from .subtitle.concurrency import ConcurrentEvents
 from .subtitle.types import Color
 from .text_processing import *
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 WHITE = Color(255, 255, 255)
 
 AUDIO_MARKERS = ("♪♪", "♪", "♬", "⚟", "⚞", "📱", "☎", "📞", "🔊", "📢", "📺", "🎤"
@@ -17,50 +25,184 @@ AUDIO_MARKERS = ("♪♪", "♪", "♬", "⚟", "⚞", "📱", "☎", "📞", "
 PARENTHESIS_START_MARKERS = ("<", "＜", "《", "｟", "≪", "〈", "［", "（（", "⟨")
 PARENTHESIS_END_MARKERS = (">", "＞", "》", "｠", "≫", "〉", "］", "））", "⟩")
 CONTINUOUS_LINE_MARKERS = ("→", "➡", "➨", "⤵️", "➥", "・")
+LINE_START_MARKERS = PARENTHESIS_START_MARKERS + ("～",)
+LINE_END_MARKERS = PARENTHESIS_END_MARKERS + CONTINUOUS_LINE_MARKERS
+
+FULL_HALF_RAW = "!?．％／＆＋－＝･“”():〜 ｡。"
+FULL_HALF_CONVERTED = "！？.%/&+-=・「」（）：～\u3000\u3000\u3000"
+
+GAIJI_PATTERN = re.compile(r"\[外：[0-9A-Z]{32}]")
+PUNCTUATION_SPACING_PATTERN = re.compile(r"(?<=[？！])(?![\u3000？！」』]|$)")
 
 
 def remove_affix(text: str, prefix: Sequence[str] | None = None, suffix: Sequence[str] | None = None) -> str:
-    if prefix is not None:
+    if prefix is not None and text.startswith(tuple(prefix)):
         for p in prefix:
             text = text.removeprefix(p)
-    if suffix is not None:
+    if suffix is not None and text.endswith(tuple(suffix)):
         for s in suffix:
             text = text.removesuffix(s)
     return text
 
 
 def remove_line_markers(text: str) -> str:
-    return remove_affix(text, PARENTHESIS_START_MARKERS + ("～",), PARENTHESIS_END_MARKERS + CONTINUOUS_LINE_MARKERS)
+    return remove_affix(text, LINE_START_MARKERS, LINE_END_MARKERS)
+
+
+def remove_audio_markers(text: str, strip: bool = False) -> str:
+    """Remove leading audio markers in order. With `strip`, whitespace is stripped after every marker."""
+    if strip:
+        text = text.removeprefix(AUDIO_MARKERS[0]).strip()
+        if text.startswith(AUDIO_MARKERS):
+            for marker in AUDIO_MARKERS[1:]:
+                text = text.removeprefix(marker).strip()
+        return text
+    if text.startswith(AUDIO_MARKERS):
+        for marker in AUDIO_MARKERS:
+            text = text.removeprefix(marker)
+    return text
 
 
-def guess_same_speaker(event1, event2, x_spacing=60, y_spacing=60) -> bool:
-    return (event1.start == event2.start and event1.end == event2.end
-            and event1.color == event1.color
-            and event1.pos.y and event2.pos.y
-            and (event1.pos.y == event2.pos.y
-                 or abs(event1.pos.x - event2.pos.x) <= x_spacing
-                 and abs(event1.pos.y - event2.pos.y) <= y_spacing
-                 )
-            )
+def preprocess_text(text: str) -> str:
+    text = remove_audio_markers(text)
+    text = text.replace("\u3000\u3000", "\u3000").strip()
+    # handle gaiji
+    if "[外" in text:
+        text = GAIJI_PATTERN.sub("", text)
+    return text
 
 
-def full_half_conversion(doc: Subtitle, conversion: FullHalfConversion, raw: str = "", converted: str = ""):
-    trans = str.maketrans(raw, converted)
-    for event in doc.events:
-        event.text = convert_half_full_numbers(event.text, conversion.numbers)
-        event.text = convert_half_full_letters(event.text, conversion.letters)
-        event.text = event.text.translate(trans)
+def clean_speaker_text(text: str, name: str) -> str:
+    text = remove_line_markers(text).strip()
+    text = remove_audio_markers(text, strip=True)
+    if text.startswith("（") and "）" in text:
+        text = text[text.index("）") + 1:]
+    elif not name.startswith("Unknown"):
+        text = text.removeprefix(name + "：").removeprefix(name + "≫")
+    text = remove_audio_markers(text, strip=True)
+    text = remove_line_markers(text).strip()
+    if "？" in text or "！" in text:
+        text = PUNCTUATION_SPACING_PATTERN.sub("\u3000", text)
+    return text
+
+
+def full_half_conversion_steps(conversion: FullHalfConversion, raw: str = "", converted: str = "") -> list:
+    # Voiced kana pairs are untouched by the other conversions, so replacing them first lets
+    # all translation tables merge into one
+    steps = [replace_half_kana_voiced] if conversion.convert_half_katakana else []
+    steps += half_full_numbers_steps(conversion.numbers)
+    steps += half_full_letters_steps(conversion.letters)
+    steps.append(str.maketrans(raw, converted))
     if conversion.convert_half_katakana:
-        for event in doc.events:
-            event.text = convert_half_katakana(event.text)
+        steps.append(TransMap.HALF_FULL_KATAKANA_MAP)
+    return steps
+
+
+def full_half_conversion(doc: Subtitle, conversion: FullHalfConversion, raw: str = "", converted: str = ""):
+    doc.events = NormalizationPlan(full_half_conversion_steps(conversion, raw, converted)).apply(doc.events)
+
+
+def build_preprocess_plan(config: ProcessingConfig) -> NormalizationPlan:
+    """Transforms applied before speakers are assigned"""
+    steps = full_half_conversion_steps(config.full_half_conversion, FULL_HALF_RAW, FULL_HALF_CONVERTED)
+    steps.append(preprocess_text)
+    return NormalizationPlan(steps)
+
+
+def build_postprocess_plan(config: ProcessingConfig) -> NormalizationPlan:
+    """Transforms applied after duplicate lines are merged"""
+    steps = []
+    if config.filter_interjections:
+        extra = config.interjections
+        if extra.words or extra.single_words or extra.patterns:
+            classifier = InterjectionClassifier(extra.patterns, extra.words, extra.single_words)
+        else:
+            classifier = DEFAULT_INTERJECTION_CLASSIFIER
+        steps.append(drop_empty(classifier.filter))
+    if config.cjk_spacing.enabled:
+        steps.append(BulkStep(partial(cjk_spacing_many, space=config.cjk_spacing.space_char)))
+    if config.repetition_adjustment.enabled:
+        steps.append(partial(adjust_repeated_syllables, connector=config.repetition_adjustment.connector))
+    mapping_step = build_mapping_step(config.mapping.text, config.mapping.regex)
+    if mapping_step is not None:
+        steps.append(mapping_step)
+    steps.append(fix_western_text)
+    return NormalizationPlan(steps)
+
+
+def merge_same_time_events(events: Sequence) -> None:
+    """Merge the texts of `events` into the first one, in order.
+
+    Consecutive lines of the same speaker are joined by a full-width space, and a change of speaker
+    starts a new line and adds the speaker to the name, as if the events were merged pairwise.
+    """
+    name = events[0].name
+    parts = [events[0].text]
+    for event in events[1:]:
+        if event.name == name:
+            parts.append("\u3000")
+        else:
+            name = name + "/" + event.name
+            parts.append("\n")
+        parts.append(event.text)
+    events[0].name = name
+    events[0].text = "".join(parts)
 
 
 class Processor:
-    def __init__(self, config: ProcessingConfig | None = None):
+    def __init__(self, config: ProcessingConfig | None = None, incremental: bool = False,
+                 event_filter: EventFilter | None = None):
         self.config = config or ProcessingConfig()
+        self.incremental = incremental  # Skip files recorded as up to date in the output manifest
+        # Applied while loading, so dropped events are never parsed. Rubi events are dropped by default.
+        self.event_filter = event_filter or EventFilter(exclude_rubi=True)
+        if self.incremental and self.event_filter.style is not None:
+            logger.warning("Incremental processing is disabled, a style predicate can't be recorded in the manifest")
+            self.incremental = False
+        self._config_hash = self._hash_config()
+        self._manifests: dict[Path, Manifest] = {}
+        self.compact_manifests = True  # Disabled in worker processes sharing output directories
+        self.hooks: list[StageHook] = []
+        self._build_plans()
 
     def set_config(self, config: ProcessingConfig) -> None:
         self.config = config
+        self._config_hash = self._hash_config()
+        self._build_plans()
+
+    def _hash_config(self) -> str:
+        """Hash of everything that changes the outputs, recorded in the manifest"""
+        config_hash = hash_config(self.config)
+        event_filter = self.event_filter
+        if event_filter.start is None and event_filter.end is None:
+            return config_hash  # Rubi events are removed while processing anyway
+        return hash_bytes(f"{config_hash}:{event_filter.start}:{event_filter.end}".encode("utf-8"))
+
+    def _build_plans(self) -> None:
+        self._preprocess_plan = build_preprocess_plan(self.config)
+        self._postprocess_plan = build_postprocess_plan(self.config)
+
+    def add_hook(self, hook: StageHook) -> None:
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: StageHook) -> None:
+        self.hooks.remove(hook)
+
+    def run_stage(self, name: str, stage: Callable[[Subtitle | None], T], doc: Subtitle | None = None) -> T:
+        """Run one named stage, notifying the hooks. Stages returning a Subtitle produce the document."""
+        if not self.hooks:
+            return stage(doc)
+        for hook in self.hooks:
+            hook.stage_started(name, doc)
+        result = stage(doc)
+        for hook in reversed(self.hooks):
+            hook.stage_finished(name, result if isinstance(result, Subtitle) else doc)
+        return result
+
+    def get_manifest(self, output_dir: Path) -> Manifest:
+        if output_dir not in self._manifests:
+            self._manifests[output_dir] = Manifest(output_dir, self.compact_manifests)
+        return self._manifests[output_dir]
 
     @overload
     def __call__(self, doc: Subtitle) -> None:
@@ -79,91 +221,143 @@ class Processor:
                 self.process_and_save(path)
             except Exception as e:
                 logger.error(f"Error processing file {doc_or_path}: {e}")
-                raise ValueError(f"Error processing file {doc_or_path}: {e}")
+                raise ValueError(f"Error processing file {doc_or_path}: {e}") from e
 
     def process_and_save(self, path: Path | str) -> None:
         logger.info(f"Starting processing {path}")
         path = Path(path)
-        doc = Subtitle.load(path)
-        self.process_subtitle(doc)
-        output_filename = path.with_name(f"{path.stem}_processed.{self.config.output.format}").name
-        output_dir = self.config.output.dir or path.parent
-        output_dir.mkdir(parents=True, exist_ok=True)
-        output_path = output_dir / output_filename
-        doc.save(output_path, self.config.output)
-        logger.info(f"Finished processing. Saved to {output_path}")
+        for hook in self.hooks:
+            hook.file_started(path)
+        try:
+            self._process_and_save(path)
+        finally:
+            for hook in reversed(self.hooks):
+                hook.file_finished(path)
+
+    def load(self, path: Path | str) -> Subtitle:
+        return Subtitle.load(path, event_filter=self.event_filter)
+
+    def parse(self, text: str) -> Subtitle:
+        return Subtitle.from_ass_text(text, event_filter=self.event_filter)
+
+    def output_path(self, path: Path | str, fmt: OutputFormat | str | None = None) -> Path:
+        """Output of `path` in `fmt`, by default in the first configured format"""
+        path = Path(path)
+        fmt = fmt or self.config.output.formats[0]
+        output_filename = path.with_name(f"{path.stem}_processed.{fmt}").name
+        return (self.config.output.dir or path.parent) / output_filename
 
-    def process_subtitle(self, doc: Subtitle) -> None:
-        logger.info("Starting subtitle processing...")
+    def output_paths(self, path: Path | str) -> list[Path]:
+        return [self.output_path(path, fmt) for fmt in self.config.output.formats]
 
-        del_list = [index for index, event in enumerate(doc.events) if event.style == "Rubi"]
-        doc.events.pop(del_list)
-        logger.info(f"Removed {len(del_list)} Rubi events")
+    def _process_and_save(self, path: Path) -> None:
+        output_path = self.output_path(path)
+        output_dir = output_path.parent
 
-        raw = "!?．％／＆＋－＝･“”():〜 ｡。"
-        converted = "！？.%/&+-=・「」（）：～\u3000\u3000\u3000"
-        full_half_conversion(doc, self.config.full_half_conversion, raw, converted)
-        logger.info("Normalized full-width/half-width characters")
+        if not self.incremental:
+            doc = self.run_stage("load", lambda _: self.load(path))
+        else:
+            if self.is_unchanged(path):
+                logger.info(f"Skipped {path}, output is up to date")
+                return
+            input_hash = self.run_stage("read", lambda _: hash_file(path))
+            if self._skip_up_to_date(path, input_hash):
+                return
+            doc = self.run_stage("load", lambda _: self.load(path))
 
-        for event in doc.events:
-            # remove audio markers
-            for marker in AUDIO_MARKERS:
-                event.text = event.text.removeprefix(marker)
-            event.text = event.text.replace("\u3000\u3000", "\u3000").strip()
-            # handle gaiji
-            event.text = re.sub(r"\[外：[0-9A-Z]{32}]", "", event.text)
-        logger.info("Completed text preprocessing")
-
-        self.set_speakers(doc)
-        logger.info("Assigned speakers")
+        self.process_subtitle(doc)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        self.run_stage("save", lambda d: self._save(d, path), doc)
+        if self.incremental:
+            self.get_manifest(output_dir).record(path, input_hash, self._config_hash, output_path)
+        logger.info(f"Finished processing. Saved to {', '.join(map(str, self.output_paths(path)))}")
+
+    def _save(self, doc: Subtitle, path: Path) -> None:
+        output = self.config.output
+        for fmt in output.formats:
+            doc.save(self.output_path(path, fmt), output.for_format(fmt))
+
+    def is_unchanged(self, path: Path) -> bool:
+        """Cheap incremental check on the input's size and mtime, without reading it"""
+        if not self.incremental:
+            return False
+        output_path = self.output_path(path)
+        return (self.get_manifest(output_path.parent).is_unchanged(path, self._config_hash, output_path)
+                and all(p.exists() for p in self.output_paths(path)))
+
+    def _skip_up_to_date(self, path: Path, input_hash: str) -> bool:
+        output_path = self.output_path(path)
+        manifest = self.get_manifest(output_path.parent)
+        if (not manifest.is_up_to_date(path, input_hash, self._config_hash, output_path)
+                or not all(p.exists() for p in self.output_paths(path))):
+            return False
+        manifest.record(path, input_hash, self._config_hash, output_path)
+        logger.info(f"Skipped {path}, output is up to date")
+        return True
+
+    def prepare_file(self, path: Path, input_hash: str | None = None) -> Subtitle | None:
+        """Load and process `path`, without saving it.
+
+        `input_hash` is the hash of the file, required for incremental processing. Returns the document
+        to pass to `write_output`, or None if the outputs are already up to date. Used by the pipelined
+        runner, which reads and writes on I/O threads.
+        """
+        if self.incremental and self._skip_up_to_date(path, input_hash):
+            return None
+        doc = self.run_stage("load", lambda _: self.load(path))
+        self.process_subtitle(doc)
+        return doc
 
-        for event in doc.events:
-            event.text = remove_line_markers(event.text).strip()
-            for marker in AUDIO_MARKERS:
-                event.text = event.text.removeprefix(marker).strip()
-            if event.text.startswith("（") and "）" in event.text:
-                event.text = event.text[event.text.index("）") + 1:]
-            elif not event.name.startswith("Unknown"):
-                event.text = event.text.removeprefix(event.name + "：").removeprefix(event.name + "≫")
-            for marker in AUDIO_MARKERS:
-                event.text = event.text.removeprefix(marker).strip()
-            event.text = remove_line_markers(event.text).strip()
-            event.text = re.sub(r"(?<=[？！])(?![\u3000？！」』]|$)", "\u3000", event.text)
-        self.filter_empty_lines(doc)
-        logger.info("Cleaned up text")
+    def write_output(self, path: Path, doc: Subtitle, input_hash: str | None = None) -> None:
+        """Stream `doc` from `prepare_file` to its outputs and record them in the manifest.
 
-        if self.config.merge_strategy != MergeStrategy.NONE:
-            self.merge_duplicate_lines_by_time(doc, self.config.merge_strategy)
-            logger.info("Merged duplicate lines based on timing")
+        Safe to call from an I/O thread, as long as `doc` is no longer changed.
+        """
+        output_path = self.output_path(path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._save(doc, path)
+        if self.incremental:
+            self.get_manifest(output_path.parent).record(path, input_hash, self._config_hash, output_path)
+        logger.info(f"Finished processing. Saved to {', '.join(map(str, self.output_paths(path)))}")
 
-        if self.config.filter_interjections:
-            for event in doc.events:
-                event.text = filter_interjections(event.text)
-            self.filter_empty_lines(doc)
-            logger.info("Filtered interjections")
+    def process_subtitle(self, doc: Subtitle) -> None:
+        logger.info("Starting subtitle processing...")
+        for name, stage in self.stages():
+            self.run_stage(name, stage, doc)
+        logger.info("Subtitle processing completed successfully")
 
-        if self.config.cjk_spacing.enabled:
-            for event in doc.events:
-                event.text = cjk_spacing(event.text, self.config.cjk_spacing.space_char)
-            logger.info("Applied CJK spacing adjustments")
+    def stages(self) -> list[tuple[str, Callable[[Subtitle], None]]]:
+        """Named processing stages in the order process_subtitle runs them"""
+        stages = [
+            ("remove_rubi", self.remove_rubi),
+            ("preprocess", self.preprocess),
+            ("set_speakers", self.set_speakers),
+            ("clean_up", self.clean_up),
+        ]
+        if self.config.merge_strategy != MergeStrategy.NONE:
+            stages.append(("merge_duplicates",
+                           partial(self.merge_duplicate_lines_by_time, strategy=self.config.merge_strategy)))
+        stages.append(("postprocess", self.postprocess))
+        return stages
 
-        if self.config.repetition_adjustment.enabled:
-            for event in doc.events:
-                event.text = adjust_repeated_syllables(event.text, self.config.repetition_adjustment.connector)
-            logger.info("Adjusted repeated syllables")
+    @staticmethod
+    def remove_rubi(doc: Subtitle) -> None:
+        removed = doc.events.compact(lambda event: event.style != "Rubi")
+        logger.info(f"Removed {removed} Rubi events")
 
-        for event in doc.events:
-            for key, value in self.config.mapping.text.items():
-                event.text = event.text.replace(key, value)
-            for pattern, replacement in self.config.mapping.regex.items():
-                event.text = re.sub(pattern, replacement, event.text)
-        logger.info(f"Finished custom text replacements")
+    def preprocess(self, doc: Subtitle) -> None:
+        doc.events = self._preprocess_plan.apply(doc.events)
+        logger.info("Normalized full-width/half-width characters and preprocessed text")
 
+    def clean_up(self, doc: Subtitle) -> None:
         for event in doc.events:
-            event.text = fix_western_text(event.text)
-        logger.info("Fixed western text formatting")
+            event.text = clean_speaker_text(event.text, event.name)
+        self.filter_empty_lines(doc)
+        logger.info("Cleaned up text")
 
-        logger.info("Subtitle processing completed successfully")
+    def postprocess(self, doc: Subtitle) -> None:
+        doc.events = self._postprocess_plan.apply(doc.events)
+        logger.info("Applied post-merge text normalization")
 
     @staticmethod
     def set_speakers(doc: Subtitle) -> None:
@@ -174,6 +368,7 @@ class Processor:
 
         none_speaker_count = 1
         same_speaker_flag = False
+        concurrent = ConcurrentEvents(doc.events, x_spacing, y_spacing)
 
         for index, event in enumerate(doc.events):
             speaker = None
@@ -181,9 +376,8 @@ class Processor:
 
             # Find the specific speaker
             if text_stripped.startswith("（") and "）" in text_stripped:
-                speaker_tmp = re.search(r"（(.*?)）", text_stripped).group(1)
-                if text_stripped[len(speaker_tmp) + 2:].strip() or index + 1 < len(doc.events) and guess_same_speaker(
-                        event, doc.events[index + 1], x_spacing, y_spacing):
+                speaker_tmp = text_stripped[1:text_stripped.index("）")]
+                if text_stripped[len(speaker_tmp) + 2:].strip() or concurrent.near_after[index]:
                     speaker = speaker_tmp.strip().removesuffix("の声")
                     if "：" in speaker:
                         speaker = speaker[speaker.index("："):].strip()
@@ -210,10 +404,8 @@ class Processor:
                     same_speaker_flag = True
                 if text.endswith(PARENTHESIS_END_MARKERS):
                     same_speaker_flag = False
-                if not speaker and not same_speaker_flag and index > 0:
-                    last_event = doc.events[index - 1]
-                    if guess_same_speaker(event, last_event, x_spacing, y_spacing):
-                        speaker = last_event.name
+                if not speaker and not same_speaker_flag and concurrent.near_before[index] is not None:
+                    speaker = doc.events[concurrent.near_before[index]].name
 
             if speaker:
                 event.name = speaker
@@ -221,39 +413,43 @@ class Processor:
                 event.name = f"Unknown{none_speaker_count}"
                 none_speaker_count += 1
 
+        # Colored events are named after their color until here, and so are events that took their speaker
         color_speaker_mapping = {
-            color: max(speakers, key=len) or f"Protagonist{i + 1}"
+            color.to_ass_string(): max(speakers, key=len) or f"Protagonist{i + 1}"
             for i, (color, speakers) in enumerate(speaker_record.items())
         }
 
         for event in doc.events:
-            if event.color in color_speaker_mapping:
-                event.name = color_speaker_mapping[event.color]
+            event.name = color_speaker_mapping.get(event.name, event.name)
+        logger.info("Assigned speakers")
 
     @staticmethod
     def merge_duplicate_lines_by_time(doc: Subtitle, strategy: MergeStrategy = MergeStrategy.AUTO) -> None:
+        """Merge events with the same start and end, even if other events lie between them.
+
+        AUTO merges lines of the same speaker, FORCE merges all of them. Each group is merged into
+        its first event, so it keeps its place, and texts are joined in their original order.
+        """
         if strategy not in MergeStrategy:
             raise ValueError(f"Invalid strategy: {strategy}")
 
         if strategy == MergeStrategy.NONE:
             return
 
-        del_list = []
+        by_speaker = strategy == MergeStrategy.AUTO
+        groups: dict[tuple, list[int]] = defaultdict(list)
+        for index, event in enumerate(doc.events):
+            groups[(event.start, event.end, event.name) if by_speaker else (event.start, event.end)].append(index)
 
-        for index in range(len(doc.events) - 1):
-            event = doc.events[index]
-            next_event = doc.events[index + 1]
-            if event.start == next_event.start and event.end == next_event.end:
-                if event.name == next_event.name:
-                    next_event.text = event.text + "\u3000" + next_event.text
-                    del_list.append(index)
-                elif strategy == MergeStrategy.FORCE:
-                    next_event.name = event.name + "/" + next_event.name
-                    next_event.text = event.text + "\n" + next_event.text
-                    del_list.append(index)
+        del_list = []
+        for indexes in groups.values():
+            if len(indexes) > 1:
+                merge_same_time_events([doc.events[index] for index in indexes])
+                del_list.extend(indexes[1:])
 
-        doc.events.pop(del_list)
+        doc.events.remove_indices(del_list)
+        logger.info("Merged duplicate lines based on timing")
 
     @staticmethod
     def filter_empty_lines(doc: Subtitle) -> None:
-        doc.events = Events(event for event in doc.events if event.text not in ("", "～"))
+        doc.events.compact(lambda event: event.text not in EMPTY_TEXTS)
@@ -0,0 +1,105 @@
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .subtitle import Subtitle
+
+__all__ = (
+    "StageHook",
+    "StageRecord",
+    "StageProfiler",
+    "build_profile_report",
+)
+
+UNNAMED_FILE = "<subtitle>"
+
+
+class StageHook:
+    """Base class of Processor hooks. Override the methods of interest."""
+
+    def file_started(self, path: Path) -> None:
+        pass
+
+    def file_finished(self, path: Path) -> None:
+        pass
+
+    def stage_started(self, stage: str, doc: Subtitle | None) -> None:
+        pass
+
+    def stage_finished(self, stage: str, doc: Subtitle | None) -> None:
+        pass
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    seconds: float
+    events_in: int
+    events_out: int
+    allocated_peak: int = 0  # Bytes, only measured while tracemalloc is tracing
+
+
+class StageProfiler(StageHook):
+    """Records wall time, event counts and allocations of every stage, grouped by file"""
+
+    def __init__(self):
+        self.files: dict[str, list[StageRecord]] = {}
+        self._current: list[StageRecord] | None = None
+        self._started: tuple[float, int, int] | None = None
+
+    def file_started(self, path: Path) -> None:
+        self._current = self.files.setdefault(str(path), [])
+
+    def file_finished(self, path: Path) -> None:
+        self._current = None
+
+    def stage_started(self, stage: str, doc: Subtitle | None) -> None:
+        import tracemalloc  # Only loaded when profiling
+
+        allocated = 0
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        self._started = (time.perf_counter(), len(doc.events) if doc else 0, allocated)
+
+    def stage_finished(self, stage: str, doc: Subtitle | None) -> None:
+        import tracemalloc
+
+        start, events_in, allocated = self._started
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - allocated if tracemalloc.is_tracing() else 0
+        records = self._current if self._current is not None else self.files.setdefault(UNNAMED_FILE, [])
+        records.append(StageRecord(stage, seconds, events_in, len(doc.events) if doc else 0, peak))
+
+    def pop(self, path: Path | str) -> list[StageRecord]:
+        return self.files.pop(str(path), [])
+
+
+def build_profile_report(files: dict[str, list[StageRecord]]) -> dict:
+    """Per-file stage records plus totals per stage across all files"""
+    stages = {}
+    for records in files.values():
+        for record in records:
+            total = stages.setdefault(record.stage, {
+                "calls": 0, "seconds": 0.0, "events_in": 0, "events_out": 0, "allocated_peak_max": 0,
+            })
+            total["calls"] += 1
+            total["seconds"] += record.seconds
+            total["events_in"] += record.events_in
+            total["events_out"] += record.events_out
+            total["allocated_peak_max"] = max(total["allocated_peak_max"], record.allocated_peak)
+    for total in stages.values():
+        events = total["events_in"] or total["events_out"]
+        total["events_per_second"] = events / total["seconds"] if total["seconds"] else 0.0
+
+    return {
+        "files": {
+            path: {
+                "seconds": sum(record.seconds for record in records),
+                "stages": [asdict(record) for record in records],
+            }
+            for path, records in files.items()
+        },
+        "stages": stages,
+        "total_seconds": sum(total["seconds"] for total in stages.values()),
+    }
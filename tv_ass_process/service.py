@@ -0,0 +1,175 @@
+"""Long-running local service keeping a warm Processor.
+
+Endpoints (HTTP on localhost, or on a Unix domain socket):
+    GET  /health                    -> "ok"
+    POST /process[?format=txt|srt|ass]  body: ASS text  -> processed text
+    POST /file                      body: {"path": "..."}  -> {"output": "...", "outputs": [...]}, written like the batch mode
+"""
+import json
+import logging
+import os
+import signal
+import socketserver
+import sys
+import threading
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from .config import OutputFormat, ProcessingConfig
+from .processor import Processor
+
+__all__ = (
+    "ProcessingService",
+    "serve",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessingService:
+    """Keeps a Processor ready, and rebuilds it when the configuration file changes"""
+
+    def __init__(self, load_config: Callable[[], ProcessingConfig], config_path: Path | str | None = None):
+        self._load_config = load_config
+        self.config_path = Path(config_path) if config_path else None
+        self._lock = threading.Lock()
+        self._mtime = self._config_mtime()
+        self.processor = Processor(load_config())
+
+    def _config_mtime(self) -> int | None:
+        try:
+            return self.config_path.stat().st_mtime_ns if self.config_path else None
+        except FileNotFoundError:
+            return None
+
+    def get_processor(self) -> Processor:
+        mtime = self._config_mtime()
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        self.processor = Processor(self._load_config())
+                        logger.info(f"Reloaded configuration from {self.config_path}")
+                    except Exception as e:
+                        logger.error(f"Failed to reload configuration, keeping the previous one: {e}")
+                    self._mtime = mtime
+        return self.processor
+
+    def process_text(self, text: str, fmt: str | None = None) -> str:
+        processor = self.get_processor()
+        doc = processor.parse(text)
+        processor.process_subtitle(doc)
+        output = processor.config.output
+        fmt = fmt or output.formats[0]
+        return doc.render(fmt, output.for_format(fmt))
+
+    def process_file(self, path: Path | str) -> list[Path]:
+        processor = self.get_processor()
+        processor.process_and_save(path)
+        return processor.output_paths(path)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections alive, every response has a Content-Length
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(format, *args)
+
+    def address_string(self) -> str:
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def send_body(self, status: int, body: str, content_type: str = "text/plain; charset=utf-8") -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path == "/health":
+            self.send_body(200, "ok")
+        else:
+            self.send_body(404, "Not found")
+
+    def content_length(self) -> int:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True  # Where the next request starts is unknown
+            raise ValueError(f"Invalid Content-Length: {self.headers.get('Content-Length')}")
+        return length
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        service: ProcessingService = self.server.service
+        # Malformed requests (including undecodable text and JSON, both ValueErrors) get 400,
+        # failures while processing get 500
+        try:
+            body = self.rfile.read(self.content_length())
+            if url.path == "/process":
+                fmt = parse_qs(url.query).get("format", [None])[0]
+                if fmt is not None and fmt not in tuple(OutputFormat):
+                    raise ValueError(f"Invalid format: {fmt}")
+                text = body.decode("utf-8-sig")
+            elif url.path == "/file":
+                request = json.loads(body)
+                if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+                    raise ValueError('Expected {"path": "..."}')
+            else:
+                self.send_body(404, "Not found")
+                return
+        except ValueError as e:
+            logger.warning(f"Bad request to {url.path}: {e}")
+            self.send_body(400, f"{type(e).__name__}: {e}")
+            return
+
+        try:
+            if url.path == "/process":
+                response = service.process_text(text, fmt)
+            else:
+                outputs = service.process_file(request["path"])
+                response = json.dumps({"output": str(outputs[0]), "outputs": list(map(str, outputs))},
+                                      ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"Failed to handle {url.path}: {e}")
+            self.send_body(500, f"{type(e).__name__}: {e}")
+            return
+        if url.path == "/process":
+            self.send_body(200, response)
+        else:
+            self.send_body(200, response, "application/json")
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def serve(service: ProcessingService, host: str = "127.0.0.1", port: int = 8765,
+          socket_path: Path | str | None = None) -> None:
+    if socket_path is not None:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise OSError("Unix domain sockets are not supported on this platform")
+        socket_path = Path(socket_path)
+        socket_path.unlink(missing_ok=True)
+        server = UnixHTTPServer(str(socket_path), RequestHandler)
+        address = str(socket_path)
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        address = f"http://{host}:{server.server_address[1]}"
+    server.service = service
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Serving on {address} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None:
+            socket_path.unlink(missing_ok=True)
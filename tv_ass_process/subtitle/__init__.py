@@ -1,3 +1,3 @@
 from .events import Dialog, Events
-from .subtitle import Subtitle, load, from_ass_text
+from .subtitle import Subtitle, EventFilter, load, iter_events, from_ass_text
 from .types import Timecode, Color
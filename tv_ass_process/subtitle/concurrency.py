@@ -0,0 +1,68 @@
+"""Index of events shown together on screen.
+
+Events are concurrent when they have the same start and end. They are grouped by time with a hash
+map, and every group is sorted by vertical position, so the events close to one are found by
+bisection instead of by comparing it with the whole group. Events with no vertical position
+(y = 0) are never close to anything.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from collections.abc import Sequence
+
+from .events import Dialog
+from .types import Position
+
+__all__ = (
+    "ConcurrentEvents",
+)
+
+
+class ConcurrentEvents:
+    """For every event, the closest concurrent event before it and whether one follows it.
+
+    Close means on the same line, or within `x_spacing` and `y_spacing` of it. This is a snapshot,
+    build a new one after adding, removing, retiming or moving events.
+    """
+
+    def __init__(self, events: Sequence[Dialog], x_spacing: int = 60, y_spacing: int = 60):
+        # Index of the closest concurrent event before each event, or None
+        self.near_before: list[int | None] = [None] * len(events)
+        # Whether a close concurrent event follows each event
+        self.near_after: list[bool] = [False] * len(events)
+
+        groups: dict[tuple[int, int], list[int]] = defaultdict(list)
+        for index, event in enumerate(events):
+            if event.pos is not None and event.pos.y:
+                groups[(event.start, event.end)].append(index)
+
+        for indexes in groups.values():
+            if len(indexes) == 2:  # Most groups, no need to sort
+                first, second = indexes
+                if self._close(events[first].pos, events[second].pos, x_spacing, y_spacing):
+                    self.near_after[first] = True
+                    self.near_before[second] = first
+            elif len(indexes) > 2:
+                self._index_group(events, indexes, x_spacing, y_spacing)
+
+    @staticmethod
+    def _close(pos: Position, other: Position, x_spacing: int, y_spacing: int) -> bool:
+        return pos.y == other.y or abs(pos.x - other.x) <= x_spacing and abs(pos.y - other.y) <= y_spacing
+
+    def _index_group(self, events: Sequence[Dialog], indexes: list[int], x_spacing: int, y_spacing: int) -> None:
+        by_y = sorted(indexes, key=lambda index: events[index].pos.y)
+        ys = [events[index].pos.y for index in by_y]
+        for index in indexes:
+            pos = events[index].pos
+            nearest = None
+            for other in by_y[bisect_left(ys, pos.y - y_spacing):bisect_right(ys, pos.y + y_spacing)]:
+                other_pos = events[other].pos
+                if other == index or not self._close(pos, other_pos, x_spacing, y_spacing):
+                    continue
+                if other > index:
+                    self.near_after[index] = True
+                    continue
+                # The closest earlier event, the latest one if several are as close
+                distance = (other_pos.x - pos.x) ** 2 + (other_pos.y - pos.y) ** 2
+                if nearest is None or (distance, -other) < nearest:
+                    nearest = (distance, -other)
+                    self.near_before[index] = other
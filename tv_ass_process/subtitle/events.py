@@ -1,5 +1,5 @@
 import logging
-from collections.abc import Sequence
+from collections.abc import Callable, Iterable, Sequence
 from dataclasses import dataclass
 
 from .types import Timecode, Position, Color
@@ -7,7 +7,7 @@ from .types import Timecode, Position, Color
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class Dialog:
     start: Timecode
     end: Timecode
@@ -25,25 +25,34 @@ class Dialog:
 class Events(list[Dialog]):
     def pop(self, index: int | Sequence[int] = -1) -> None:
         if isinstance(index, int):
-            index = (index,)
-        for i in sorted(index, reverse=True):
-            super().pop(i)
+            super().pop(index)
+        else:
+            self.remove_indices(index)
+
+    def remove_indices(self, indices: Iterable[int]) -> int:
+        """Remove the events at `indices` in place, in one pass. Returns the number of removed events."""
+        size = len(self)
+        removed = set()
+        for i in indices:
+            if not -size <= i < size:
+                raise IndexError("pop index out of range")
+            removed.add(i % size)
+        if removed:
+            self[:] = [event for i, event in enumerate(self) if i not in removed]
+        return len(removed)
+
+    def compact(self, keep: Callable[[Dialog], bool]) -> int:
+        """Keep only the events `keep` returns True for, in place. Returns the number of removed events."""
+        size = len(self)
+        self[:] = [event for event in self if keep(event)]
+        return size - len(self)
 
     def to_ass_string(self, show_speaker: bool = False, ending_char: str = "") -> str:
-        return "\n".join(l.to_ass_string(show_speaker, ending_char) for l in self)
+        from .writers import ass_lines
+
+        return "\n".join(ass_lines(self, show_speaker, ending_char))
 
     def to_srt_string(self, show_speaker: bool = False, ending_char: str = "") -> str:
-        result = []
-        for i, line in enumerate(self):
-            result.append(
-                "%d\n%s --> %s\n%s%s%s\n"
-                % (
-                    i + 1,
-                    line.start.to_srt_string(),
-                    line.end.to_srt_string(),
-                    f"{{{line.name}}}" if show_speaker and line.name else "",
-                    line.text,
-                    ending_char,
-                )
-            )
-        return "\n".join(result)
+        from .writers import srt_blocks
+
+        return "\n".join(srt_blocks(self, show_speaker, ending_char))
@@ -1,21 +1,130 @@
+import io
 import logging
 import re
+import sys
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
 from pathlib import Path
+from typing import TextIO
 
 from .events import Dialog, Events
 from .types import Timecode, Position, Color
-from ..config import OutputSettings
-from ..constants import ASS_HEADER
+from .writers import write_events
+from ..config import OutputFormat, OutputSettings
 
 __all__ = (
     "Subtitle",
+    "EventFilter",
     "load",
+    "iter_events",
     "from_ass_text",
 )
 
 logger = logging.getLogger(__name__)
 
 OVERRIDE_BLOCK_PATTERN = re.compile(r"(?<!\\){([^}]*)}")
+BLOCK_PATTERN = re.compile(r"{([^}]*)}")
+POS_PATTERN = re.compile(r"\\pos\((\d+),(\d+)\)")
+COLOR_PATTERN = re.compile(r"\\c([&hH0-9a-fA-F]+?)(?=[\\}])")
+BLOCK_COLOR_PATTERN = re.compile(r"\\c([&hH0-9a-fA-F]+?)(?=\\|\Z)")
+COLOR_TAG_PATTERN = re.compile(r"\\c&[0-9a-fhA-FH]")
+ADJACENT_COLOR_PATTERN = re.compile(r"{([^}]*)\\c&[0-9a-fhA-FH]([^}]*)}(\s*{\\c&[0-9a-fhA-FH][^}]*})")
+WHITE = Color(255, 255, 255)
+RUBI_MARKER = "\\fscx50\\fscy50"
+
+
+@dataclass(frozen=True)
+class EventFilter:
+    """Events to keep while loading, checked before the text of a line is parsed"""
+    style: Callable[[str], bool] | None = None  # Keep events whose style it returns True for
+    start: int | None = None  # Time window in milliseconds, events overlapping it are kept
+    end: int | None = None
+    exclude_rubi: bool = False
+
+    def accepts(self, start: int, end: int, style: str) -> bool:
+        if self.exclude_rubi and style == "Rubi":
+            return False
+        if self.start is not None and end <= self.start or self.end is not None and start >= self.end:
+            return False
+        return self.style is None or self.style(style)
+
+
+def scan_override_tags(text: str) -> tuple[str, Position, Color]:
+    """Position, colour and plain text of a dialog text, in one pass over its override blocks.
+
+    When a colour block is directly followed by another one, the last colour tag of the first
+    block is dropped, so the later colour wins.
+    """
+    if "{" not in text:
+        if "\\" in text:
+            return _scan_override_tags_regex(text)
+        return text, Position(0, 0), WHITE
+
+    parts = BLOCK_PATTERN.split(text)
+    pieces = parts[::2]
+    blocks = parts[1::2]
+    plain = "".join(pieces)
+    if "\\" in plain:
+        return _scan_override_tags_regex(text)  # Tags outside blocks or escaped braces
+
+    pos = Position(0, 0)
+    for block in blocks:
+        if "\\pos(" in block and (pos_match := POS_PATTERN.search(block)):
+            pos = Position(*map(int, pos_match.groups()))
+            break
+    return plain, pos, _first_block_color(blocks, pieces)
+
+
+def _first_block_color(blocks: list[str], pieces: list[str]) -> Color:
+    if len(blocks) == 1:  # Most lines
+        color_match = BLOCK_COLOR_PATTERN.search(blocks[0]) if "\\c" in blocks[0] else None
+        return Color.parse(color_match[1]) if color_match else WHITE
+    index = 0
+    while index < len(blocks):
+        candidates = [blocks[index]]
+        if ("\\c" in blocks[index] and index + 1 < len(blocks) and not pieces[index + 1].strip()
+                and COLOR_TAG_PATTERN.match(blocks[index + 1])
+                and (tags := list(COLOR_TAG_PATTERN.finditer(blocks[index])))):
+            # Directly followed by another colour block: drop the last colour tag of this block,
+            # and the following block can't start another collapse
+            block = blocks[index]
+            candidates = [block[:tags[-1].start()] + block[tags[-1].end():], blocks[index + 1]]
+        for block in candidates:
+            if "\\c" in block and (color_match := BLOCK_COLOR_PATTERN.search(block)):
+                return Color.parse(color_match[1])
+        index += len(candidates)
+    return WHITE
+
+
+def _scan_override_tags_regex(text: str) -> tuple[str, Position, Color]:
+    pos_match = POS_PATTERN.search(text)
+    pos = Position(*map(int, pos_match.groups())) if pos_match else Position(0, 0)
+    text = ADJACENT_COLOR_PATTERN.sub(r"{\1\2}\3", text)
+    color_match = COLOR_PATTERN.search(text)
+    color = Color.parse(color_match.group(1)) if color_match else WHITE
+    return OVERRIDE_BLOCK_PATTERN.sub("", text), pos, color
+
+
+def parse_ass_dialog(line: str, event_filter: EventFilter | None = None) -> Dialog | None:
+    """Parse a Dialogue line, or return None if `event_filter` rejects it"""
+    splits = line.split(",", 9)
+
+    start = Timecode.parse(splits[1].strip())
+    end = Timecode.parse(splits[2].strip())
+    style = "Rubi" if RUBI_MARKER in splits[9] else splits[3].strip()
+    if event_filter is not None and not event_filter.accepts(start, end, style):
+        return None
+
+    style = sys.intern(style)
+    name = sys.intern(splits[4].strip())
+    text = splits[9].replace("\\N", "\n").strip()
+    text, pos, color = scan_override_tags(text)
+    return Dialog(start, end, text, style, name, pos, color)
+
+
+def output_encoding(path: Path | str) -> str:
+    """ASS files are written with a BOM"""
+    return "utf-8-sig" if Path(path).suffix == ".ass" else "utf-8"
 
 
 class Subtitle:
@@ -25,92 +134,74 @@ class Subtitle:
         self.events = Events()
 
     @classmethod
-    def load(cls, path: Path | str, encoding: str = "utf-8") -> "Subtitle":
-        path = Path(path)
-        return cls.from_ass_text(path.open("r", encoding=encoding).read())
+    def load(cls, path: Path | str, encoding: str = "utf-8", event_filter: EventFilter | None = None) -> "Subtitle":
+        doc = cls()
+        doc.events.extend(cls.iter_events(path, encoding, doc, event_filter))
+        return doc
 
     @classmethod
-    def from_ass_text(cls, text: str) -> "Subtitle":
-        def parse_ass_dialog(line: str) -> Dialog:
-            splits = line.split(",", 9)
-
-            start = Timecode(splits[1].strip())
-            end = Timecode(splits[2].strip())
-            style = splits[3].strip()
-            name = splits[4].strip()
-            text = splits[9].replace("\\N", "\n").strip()
-
-            if "\\fscx50\\fscy50" in text:
-                style = "Rubi"
-
-            pos_match = re.search(r"\\pos\((\d+),(\d+)\)", text)
-            pos = Position(*map(int, pos_match.groups())) if pos_match else Position(0, 0)
-
-            text = re.sub(r"{([^}]*)\\c&[0-9a-fhA-FH]([^}]*)}(\s*{\\c&[0-9a-fhA-FH][^}]*})", r"{\1\2}\3", text)
-            color_match = re.search(r"\\c([&hH0-9a-fA-F]+?)(?=[\\}])", text)
-            color = Color.parse(color_match.group(1)) if color_match else Color(255, 255, 255)
-
-            text = OVERRIDE_BLOCK_PATTERN.sub("", text)
+    def iter_events(cls, path: Path | str, encoding: str = "utf-8", doc: "Subtitle | None" = None,
+                    event_filter: EventFilter | None = None) -> Iterator[Dialog]:
+        """Read an ASS file line by line and yield its dialogs accepted by `event_filter`.
 
-            return Dialog(start, end, text, style, name, pos, color)
+        PlayResX/PlayResY are stored on `doc` as they appear, if given.
+        """
+        doc = doc or cls()
+        with open(path, "r", encoding=encoding) as f:
+            yield from doc._parse_lines(f, event_filter)
 
+    @classmethod
+    def from_ass_text(cls, text: str, event_filter: EventFilter | None = None) -> "Subtitle":
         doc = cls()
-        lines = text.strip().splitlines()
+        doc.events.extend(doc._parse_lines(text.strip().splitlines(), event_filter))
+        return doc
+
+    def _parse_lines(self, lines: Iterable[str], event_filter: EventFilter | None = None) -> Iterator[Dialog]:
         for line in lines:
             if line.startswith("Dialogue:"):
-                doc.events.append(parse_ass_dialog(line))
+                if (event := parse_ass_dialog(line, event_filter)) is not None:
+                    yield event
             elif "ResX:" in line:
                 try:
-                    doc.res_x = int(re.search(r"ResX: ?(\d+)", line).group(1))
+                    self.res_x = int(re.search(r"ResX: ?(\d+)", line).group(1))
                 except ValueError:
                     logger.warning("PlayResX is not a number")
             elif "ResY:" in line:
                 try:
-                    doc.res_y = int(re.search(r"ResY: ?(\d+)", line).group(1))
+                    self.res_y = int(re.search(r"ResY: ?(\d+)", line).group(1))
                 except ValueError:
                     logger.warning("PlayResY is not a number")
-        return doc
 
     def to_ass(self, show_speaker: bool = False, ending_char: str = "") -> str:
-        return ASS_HEADER + self.events.to_ass_string(show_speaker, ending_char)
+        return self.render(OutputFormat.ASS, OutputSettings(show_speaker=show_speaker, ending=ending_char))
 
     def to_srt(self, show_speaker: bool = False, ending_char: str = "") -> str:
-        return self.events.to_srt_string(show_speaker, ending_char)
+        return self.render(OutputFormat.SRT, OutputSettings(show_speaker=show_speaker, ending=ending_char))
 
     def to_txt(self, show_speaker: bool = False, ending_char: str = "", show_pause_tip: int = 0) -> str:
-        result = []
-        last_end = 0
-        for event in self.events:
-            if event.start - last_end >= show_pause_tip * 1000 > 0:
-                result.append(f"({(event.start - last_end) // 1000}-second pause)")
-            last_end = event.end
-            text = event.text.replace("\n", "\u3000")
-            result.append(
-                f"[{event.name}]\t{text}{ending_char}"
-                if show_speaker
-                else f"{text}{ending_char}"
-            )
-        return "\n".join(result)
+        return self.render(OutputFormat.TXT, OutputSettings(show_speaker=show_speaker, ending=ending_char,
+                                                            show_pause_tip=show_pause_tip))
+
+    def write(self, f: TextIO, fmt: OutputFormat | str, config: OutputSettings | None = None) -> None:
+        """Stream the events in `fmt` to a text file object, such as an open file or sys.stdout"""
+        write_events(f, self.events, fmt, config)
+
+    def render(self, fmt: OutputFormat | str, config: OutputSettings | None = None) -> str:
+        buffer = io.StringIO()
+        self.write(buffer, fmt, config)
+        return buffer.getvalue()
 
     def save(self, path: Path | str, config: OutputSettings | None = None) -> None:
-        config = config or OutputSettings()
         path = Path(path)
-        if path.suffix == ".ass":
-            text = self.to_ass(config.show_speaker, config.ending)
-        elif path.suffix == ".srt":
-            text = self.to_srt(config.show_speaker, config.ending)
-        elif path.suffix == ".txt":
-            text = self.to_txt(config.show_speaker, config.ending, config.show_pause_tip)
-        else:
+        if path.suffix[1:] not in tuple(OutputFormat):
             raise ValueError(f"Invalid format: {path.suffix}")
-
-        encoding = "utf-8-sig" if path.suffix == ".ass" else "utf-8"
-        with open(path, "w", encoding=encoding) as f:
-            f.write(text)
+        with open(path, "w", encoding=output_encoding(path)) as f:
+            self.write(f, path.suffix[1:], config)
 
     def __repr__(self) -> str:
         return f"Subtitle(with {len(self.events)} events)"
 
 
 load = Subtitle.load
+iter_events = Subtitle.iter_events
 from_ass_text = Subtitle.from_ass_text
@@ -1,8 +1,16 @@
 from dataclasses import dataclass
+from functools import lru_cache
 from itertools import takewhile
 
+INTERN_LIMIT = 65536  # Upper bound of distinct interned positions/colors
+
+_positions: dict[tuple[int, int], "Position"] = {}
+_colors: dict[tuple[int, int, int], "Color"] = {}
+
 
 class Timecode(int):
+    __slots__ = ()
+
     def __new__(cls, time: str | int):
         if isinstance(time, int):
             return super().__new__(cls, time)
@@ -20,6 +28,12 @@ class Timecode(int):
 
         raise ValueError(f"Invalid time format: {time}")
 
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def parse(cls, time: str) -> "Timecode":
+        """Cached constructor, adjacent events often share timestamps"""
+        return cls(time)
+
     def __repr__(self):
         return f"Timecode({int(self)})"
 
@@ -39,19 +53,44 @@ class Timecode(int):
         return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Position:
+    """Immutable and interned, equal positions share one instance"""
     x: int
     y: int
 
+    def __new__(cls, x: int, y: int):
+        key = (x, y)
+        if (position := _positions.get(key)) is None:
+            position = object.__new__(cls)
+            if len(_positions) < INTERN_LIMIT:
+                _positions[key] = position
+        return position
 
-@dataclass(frozen=True)
+    def __getnewargs__(self):
+        return self.x, self.y
+
+
+@dataclass(frozen=True, slots=True)
 class Color:
+    """Immutable and interned, equal colors share one instance"""
     r: int
     g: int
     b: int
 
+    def __new__(cls, r: int, g: int, b: int):
+        key = (r, g, b)
+        if (color := _colors.get(key)) is None:
+            color = object.__new__(cls)
+            if len(_colors) < INTERN_LIMIT:
+                _colors[key] = color
+        return color
+
+    def __getnewargs__(self):
+        return self.r, self.g, self.b
+
     @classmethod
+    @lru_cache(maxsize=256)
     def parse(cls, color_str: str):
         color_str = color_str.upper().lstrip("&H").lstrip(" \t")
         color_str = "".join(takewhile(lambda x: x in "0123456789ABCDEF", color_str))
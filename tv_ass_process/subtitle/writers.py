@@ -0,0 +1,106 @@
+"""Streaming output writers.
+
+Every format is produced line by line and written to a text file object in chunks, so the whole
+rendered file is never held in memory. Any writable text stream works, including stdout and pipes.
+"""
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import islice
+from typing import TextIO
+
+from .events import Dialog
+from ..config import OutputFormat, OutputSettings
+from ..constants import ASS_HEADER
+
+__all__ = (
+    "pauses_before",
+    "ass_lines",
+    "srt_blocks",
+    "txt_lines",
+    "write_ass",
+    "write_srt",
+    "write_txt",
+    "write_events",
+)
+
+CHUNK_LINES = 512  # Lines joined per write call
+
+
+def _write_joined(f: TextIO, lines: Iterable[str], separator: str = "\n") -> None:
+    """Write separator.join(lines) to `f`, without building the whole string"""
+    lines = iter(lines)
+    first = True
+    while chunk := list(islice(lines, CHUNK_LINES)):
+        if not first:
+            f.write(separator)
+        f.write(separator.join(chunk))
+        first = False
+
+
+def ass_lines(events: Iterable[Dialog], show_speaker: bool = False, ending_char: str = "") -> Iterator[str]:
+    for event in events:
+        yield event.to_ass_string(show_speaker, ending_char)
+
+
+def srt_blocks(events: Iterable[Dialog], show_speaker: bool = False, ending_char: str = "") -> Iterator[str]:
+    for i, line in enumerate(events):
+        yield (
+            "%d\n%s --> %s\n%s%s%s\n"
+            % (
+                i + 1,
+                line.start.to_srt_string(),
+                line.end.to_srt_string(),
+                f"{{{line.name}}}" if show_speaker and line.name else "",
+                line.text,
+                ending_char,
+            )
+        )
+
+
+def pauses_before(events: Sequence[Dialog], min_pause: int) -> dict[int, int]:
+    """Indexes of events preceded by a pause of at least `min_pause` ms, mapped to the pause length"""
+    if min_pause <= 0:
+        return {}
+    pauses = {}
+    last_end = 0
+    for index, event in enumerate(events):
+        if event.start - last_end >= min_pause:
+            pauses[index] = event.start - last_end
+        last_end = event.end
+    return pauses
+
+
+def txt_lines(events: Sequence[Dialog], show_speaker: bool = False, ending_char: str = "",
+              show_pause_tip: int = 0) -> Iterator[str]:
+    pauses = pauses_before(events, show_pause_tip * 1000)
+    for index, event in enumerate(events):
+        if index in pauses:
+            yield f"({pauses[index] // 1000}-second pause)"
+        text = event.text.replace("\n", "\u3000")
+        yield f"[{event.name}]\t{text}{ending_char}" if show_speaker else f"{text}{ending_char}"
+
+
+def write_ass(f: TextIO, events: Iterable[Dialog], show_speaker: bool = False, ending_char: str = "") -> None:
+    f.write(ASS_HEADER)
+    _write_joined(f, ass_lines(events, show_speaker, ending_char))
+
+
+def write_srt(f: TextIO, events: Iterable[Dialog], show_speaker: bool = False, ending_char: str = "") -> None:
+    _write_joined(f, srt_blocks(events, show_speaker, ending_char))
+
+
+def write_txt(f: TextIO, events: Sequence[Dialog], show_speaker: bool = False, ending_char: str = "",
+              show_pause_tip: int = 0) -> None:
+    _write_joined(f, txt_lines(events, show_speaker, ending_char, show_pause_tip))
+
+
+def write_events(f: TextIO, events: Sequence[Dialog], fmt: OutputFormat | str,
+                 config: OutputSettings | None = None) -> None:
+    config = config or OutputSettings()
+    if fmt == OutputFormat.ASS:
+        write_ass(f, events, config.show_speaker, config.ending)
+    elif fmt == OutputFormat.SRT:
+        write_srt(f, events, config.show_speaker, config.ending)
+    elif fmt == OutputFormat.TXT:
+        write_txt(f, events, config.show_speaker, config.ending, config.show_pause_tip)
+    else:
+        raise ValueError(f"Invalid format: {fmt}")
@@ -1,4 +1,6 @@
 import re
+from collections.abc import Iterable, Sequence
+from functools import cached_property, lru_cache
 
 from .config import ConversionStrategy
 
@@ -13,6 +15,22 @@ HALF_LETTER = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
 FULL_LETTER = "ａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ"
 
 
+HALF_KANA_VOICED = {
+    "ｶﾞ": "ガ", "ｷﾞ": "ギ", "ｸﾞ": "グ", "ｹﾞ": "ゲ", "ｺﾞ": "ゴ",
+    "ｻﾞ": "ザ", "ｼﾞ": "ジ", "ｽﾞ": "ズ", "ｾﾞ": "ゼ", "ｿﾞ": "ゾ",
+    "ﾀﾞ": "ダ", "ﾁﾞ": "ヂ", "ﾂﾞ": "ヅ", "ﾃﾞ": "デ", "ﾄﾞ": "ド",
+    "ﾊﾞ": "バ", "ﾋﾞ": "ビ", "ﾌﾞ": "ブ", "ﾍﾞ": "ベ", "ﾎﾞ": "ボ",
+    "ﾊﾟ": "パ", "ﾋﾟ": "ピ", "ﾌﾟ": "プ", "ﾍﾟ": "ペ", "ﾎﾟ": "ポ",
+    "ｳﾞ": "ヴ",
+}
+
+HALF_KANA_VOICED_PATTERN = re.compile("|".join(HALF_KANA_VOICED))
+SINGLE_DIGIT_PATTERN = re.compile(r"(?<!\d)(\d)(?!\d)")
+SINGLE_LETTER_PATTERN = re.compile(r"(?<![a-zA-Z])([a-zA-Z])(?![a-zA-Z])")
+WESTERN_SEGMENT_PATTERN = re.compile(r"(^|\u3000)([0-9a-zA-Z？！\u3000]*)($|\u3000)")
+SYLLABLE_PATTERN = re.compile(r"[あ-んア-ヴ][ゃゅょァィゥェォャュョ]?")
+
+
 class TransMap:
     HALF_FULL_KATAKANA_MAP = str.maketrans(HALF_KANA, FULL_KANA)
     FULL_HALF_DIGIT_MAP = str.maketrans(FULL_DIGIT, HALF_DIGIT)
@@ -21,14 +39,32 @@ class TransMap:
     HALF_FULL_LETTER_MAP = str.maketrans(HALF_LETTER, FULL_LETTER)
 
 
+def replace_half_kana_voiced(text) -> str:
+    if "ﾞ" not in text and "ﾟ" not in text:
+        return text
+    return HALF_KANA_VOICED_PATTERN.sub(lambda m: HALF_KANA_VOICED[m[0]], text)
+
+
 def convert_half_katakana(text) -> str:
-    text = text.replace('ｶﾞ', 'ガ').replace('ｷﾞ', 'ギ').replace('ｸﾞ', 'グ').replace('ｹﾞ', 'ゲ').replace('ｺﾞ', 'ゴ')
-    text = text.replace('ｻﾞ', 'ザ').replace('ｼﾞ', 'ジ').replace('ｽﾞ', 'ズ').replace('ｾﾞ', 'ゼ').replace('ｿﾞ', 'ゾ')
-    text = text.replace('ﾀﾞ', 'ダ').replace('ﾁﾞ', 'ヂ').replace('ﾂﾞ', 'ヅ').replace('ﾃﾞ', 'デ').replace('ﾄﾞ', 'ド')
-    text = text.replace('ﾊﾞ', 'バ').replace('ﾋﾞ', 'ビ').replace('ﾌﾞ', 'ブ').replace('ﾍﾞ', 'ベ').replace('ﾎﾞ', 'ボ')
-    text = text.replace('ﾊﾟ', 'パ').replace('ﾋﾟ', 'ピ').replace('ﾌﾟ', 'プ').replace('ﾍﾟ', 'ペ').replace('ﾎﾟ', 'ポ')
-    text = text.replace('ｳﾞ', 'ヴ')
-    return text.translate(TransMap.HALF_FULL_KATAKANA_MAP)
+    return replace_half_kana_voiced(text).translate(TransMap.HALF_FULL_KATAKANA_MAP)
+
+
+def half_full_conversion_steps(full_half_mapping, half_full_mapping, single_pattern: re.Pattern,
+                               strategy) -> list:
+    """Conversion as normalization steps: translation tables, or callables for single_full"""
+    match strategy:
+        case ConversionStrategy.SKIP:
+            return []
+        case ConversionStrategy.HALF:
+            return [full_half_mapping]
+        case ConversionStrategy.FULL:
+            return [half_full_mapping]
+        case ConversionStrategy.SINGLE_FULL:
+            def convert_single(text: str) -> str:
+                return single_pattern.sub(lambda m: m[1].translate(half_full_mapping), text)
+
+            return [full_half_mapping, convert_single]
+    raise ValueError(f"Invalid conversion strategy: {strategy}")
 
 
 def convert_half_full_chars(text, full_half_mapping, half_full_mapping, strategy) -> str:
@@ -41,8 +77,8 @@ def convert_half_full_chars(text, full_half_mapping, half_full_mapping, strategy
             return text.translate(half_full_mapping)
         case ConversionStrategy.SINGLE_FULL:
             text = text.translate(full_half_mapping)
-            text = re.sub(r"(?<!\d)(\d)(?!\d)", lambda m: m[1].translate(half_full_mapping), text)
-            text = re.sub(r"(?<![a-zA-Z])([a-zA-Z])(?![a-zA-Z])", lambda m: m[1].translate(half_full_mapping), text)
+            text = SINGLE_DIGIT_PATTERN.sub(lambda m: m[1].translate(half_full_mapping), text)
+            text = SINGLE_LETTER_PATTERN.sub(lambda m: m[1].translate(half_full_mapping), text)
             return text
     raise ValueError(f"Invalid conversion strategy: {strategy}")
 
@@ -55,102 +91,154 @@ def convert_half_full_letters(text, strategy: ConversionStrategy = ConversionStr
     return convert_half_full_chars(text, TransMap.FULL_HALF_LETTER_MAP, TransMap.HALF_FULL_LETTER_MAP, strategy)
 
 
+def half_full_numbers_steps(strategy: ConversionStrategy = ConversionStrategy.HALF) -> list:
+    return half_full_conversion_steps(TransMap.FULL_HALF_DIGIT_MAP, TransMap.HALF_FULL_DIGIT_MAP,
+                                      SINGLE_DIGIT_PATTERN, strategy)
+
+
+def half_full_letters_steps(strategy: ConversionStrategy = ConversionStrategy.HALF) -> list:
+    return half_full_conversion_steps(TransMap.FULL_HALF_LETTER_MAP, TransMap.HALF_FULL_LETTER_MAP,
+                                      SINGLE_LETTER_PATTERN, strategy)
+
+
 def fix_western_text(text: str) -> str:
     def replace(match):
         return match.group(1) + match.group(2).replace("\u3000", " ").replace("！", "!").replace("？", "?") + match.group(
             3)
 
-    text = re.sub(r"(^|\u3000)([0-9a-zA-Z？！\u3000]*)($|\u3000)", replace, text)
-    return text
+    return WESTERN_SEGMENT_PATTERN.sub(replace, text)
 
 
-def cjk_spacing(text: str, space: str = "\u2006") -> str:
-    def is_cjk_char(ch: str) -> bool:
-        return any(start <= ord(ch) <= end for start, end in CJK_RANGES)
+def _ranges_to_class(ranges) -> str:
+    return "".join(f"\\U{start:08x}-\\U{end:08x}" for start, end in ranges)
 
-    def is_an_char(ch: str) -> bool:
-        return any(start <= ord(ch) <= end for start, end in AN_RANGES)
 
-    an_exclude = "!?.,~"
-    result = []
-    last_cjk = False
-    last_an = False
+CJK_AN_EXCLUDE = "!?.,~"
+CJK_SPACING_SEPARATOR = "\0"  # Neither CJK nor alphanumeric, so no space is inserted next to it
 
-    for char in text:
-        current_cjk = is_cjk_char(char)
-        current_an = is_an_char(char)
 
-        if last_an and current_cjk:
-            result.append(space)
-        elif last_cjk and current_an and char not in an_exclude:
-            result.append(space)
+@lru_cache(maxsize=None)
+def cjk_spacing_pattern() -> re.Pattern:
+    """Compiled on first use, as CJK spacing is disabled by default"""
+    return re.compile(
+        f"(?<=[{_ranges_to_class(AN_RANGES)}])(?=[{_ranges_to_class(CJK_RANGES)}])"
+        f"|(?<=[{_ranges_to_class(CJK_RANGES)}])(?=[{_ranges_to_class(AN_RANGES)}])(?![{re.escape(CJK_AN_EXCLUDE)}])"
+    )
 
-        result.append(char)
-        last_cjk, last_an = current_cjk, current_an
 
-    return "".join(result)
+def cjk_spacing(text: str, space: str = "\u2006") -> str:
+    return cjk_spacing_pattern().sub(space.replace("\\", "\\\\"), text)
+
+
+def cjk_spacing_many(texts: Sequence[str], space: str = "\u2006") -> list[str]:
+    """Apply cjk_spacing to many texts with a single regex pass"""
+    if not texts:
+        return []
+    joined = CJK_SPACING_SEPARATOR.join(texts)
+    if joined.count(CJK_SPACING_SEPARATOR) != len(texts) - 1:
+        return [cjk_spacing(text, space) for text in texts]
+    return cjk_spacing(joined, space).split(CJK_SPACING_SEPARATOR)
+
+
+TRASH_PATTERNS = (
+    r"[ウフブ][ゥウッフプンー]+",
+    r"ふん(ふん)+",
+    r"[アウハフワ][ァアウッハワ]+",
+    r"[うぐひふ][ぇえ]+",
+    r"[うぐふ][ぅうお]+",
+    r"([うぐふ]|う)わ?[ぁあ]+",
+    r"[あは][ぁあ][ぁあ]+",
+    r"[うひ][ぃい]+",
+    r"[エヘ][ッヘー]+",
+    r"ヒ[ィイッヒー]+",
+    r"[うふ]ふ+",
+    r"[ウクグワ][ァォオグッワー]+",
+    r"[うはほ][はわぁ]+",
+    r"ン[ンフッ]+",
+    r"ギ[イィ]+",
+    r"(ふぎゃ|ぎゃあ|ひゃ|うりゃ|ふひゃ)[ぁあ]*",
+    r"あ?わわ+[ぁあ]*",
+    r"[ほホ](ふ[ぅゥ]*|[ぅゥ]+)",
+)
+
+TRASH_WORDS = frozenset({
+    "", "\u3000", "あん", "うえぇん", "うっわ", "くぅ", "くぅん", "ぐぬ", "ぐぬぅ", "ぐふ", "すぅ", "ぜぇ",
+    "ぬぁ", "ぬおおお", "はぁ", "ウーム", "ふぐ", "むふ", "ん", "んあ", "んぐぐ", "んはは", "んん",
+    "んんぃ", "ぬあ", "クックックッ", "ゲコ", "どわ", "はむ",
+})
+
+TRASH_SINGLE = frozenset({
+    "あ", "あぁ", "う", "お", "く", "ぐ", "ぬ", "は", "ひ", "ふ", "ぶ", "へ", "ほ", "わ", "げ", "ひゃ",
+    "ウ", "ハ", "ヒ", "フ", "ク", "ン",
+})
+
+
+class InterjectionClassifier:
+    """Classifies \u3000-separated elements of a line as interjections.
+
+    Patterns are compiled into one regex, and results are cached by the cleaned element. Extra
+    patterns with groups are compiled on their own, so their backreferences keep their numbering.
+    """
+    KEEP = 0
+    SINGLE = 1  # Dropped only when the whole line is interjections
+    TRASH = 2  # Dropped at the beginning and end of a line
+
+    CLEANUP_MAP = str.maketrans("", "", "！？…～っッ")
+
+    def __init__(self, patterns: Iterable[str] = (), words: Iterable[str] = (), single_words: Iterable[str] = (),
+                 cache_size: int | None = 4096):
+        self.patterns = TRASH_PATTERNS + tuple(patterns)
+        self._extra_patterns = tuple(patterns)
+        self.words = TRASH_WORDS.union(words)
+        self.single_words = TRASH_SINGLE.union(single_words)
+        self._classify_cleaned = lru_cache(maxsize=cache_size)(self._classify)
+
+    @cached_property
+    def _compiled_patterns(self) -> tuple[re.Pattern, ...]:
+        grouped = [pattern for pattern in self._extra_patterns if re.compile(pattern).groups]
+        joined = [pattern for pattern in self.patterns if pattern not in grouped]
+        return (re.compile("|".join(f"(?:{pattern})" for pattern in joined)),
+                *(re.compile(pattern) for pattern in grouped))
+
+    def _classify(self, element: str) -> int:
+        if element in self.single_words:
+            return self.SINGLE
+        if element in self.words or any(pattern.fullmatch(element) for pattern in self._compiled_patterns):
+            return self.TRASH
+        return self.KEEP
+
+    def classify(self, element: str) -> int:
+        return self._classify_cleaned(element.translate(self.CLEANUP_MAP))
+
+    def filter(self, text: str) -> str:
+        if not text:
+            return ""
 
+        elements = text.split("\u3000")
+        trash_flag = [self.classify(element) for element in elements]
 
-def filter_interjections(text) -> str:
-    if not text:
-        return ""
+        if all(trash_flag):
+            return ""
 
-    TRASH_RE = [
-        r"[ウフブ][ゥウッフプンー]+",
-        r"ふん(ふん)+",
-        r"[アウハフワ][ァアウッハワ]+",
-        r"[うぐひふ][ぇえ]+",
-        r"[うぐふ][ぅうお]+",
-        r"([うぐふ]|う)わ?[ぁあ]+",
-        r"[あは][ぁあ][ぁあ]+",
-        r"[うひ][ぃい]+",
-        r"[エヘ][ッヘー]+",
-        r"ヒ[ィイッヒー]+",
-        r"[うふ]ふ+",
-        r"[ウクグワ][ァォオグッワー]+",
-        r"[うはほ][はわぁ]+",
-        r"ン[ンフッ]+",
-        r"ギ[イィ]+",
-        r"(ふぎゃ|ぎゃあ|ひゃ|うりゃ|ふひゃ)[ぁあ]*",
-        r"あ?わわ+[ぁあ]*",
-        r"[ほホ](ふ[ぅゥ]*|[ぅゥ]+)",
-    ]
-
-    TRASH_STR = {"", "\u3000", "あん", "うえぇん", "うっわ", "くぅ", "くぅん", "ぐぬ", "ぐぬぅ", "ぐふ", "すぅ", "ぜぇ",
-                 "ぬぁ", "ぬおおお", "はぁ", "ウーム", "ふぐ", "むふ", "ん", "んあ", "んぐぐ", "んはは", "んん",
-                 "んんぃ", "ぬあ", "クックックッ", "ゲコ", "どわ", "はむ", }
-
-    TRASH_SINGLE = {"あ", "あぁ", "う", "お", "く", "ぐ", "ぬ", "は", "ひ", "ふ", "ぶ", "へ", "ほ", "わ", "げ", "ひゃ",
-                    "ウ", "ハ", "ヒ", "フ", "ク", "ン", }
-
-    cleanup_pattern = re.compile(r"[！？…～っッ]")
-    compiled_trash_re = [re.compile(pattern) for pattern in TRASH_RE]
-
-    elements = text.split("\u3000")
-
-    test_case = [cleanup_pattern.sub("", element) for element in elements]
-    trash_flag = [
-        1 if single in TRASH_SINGLE
-        else 2 if single in TRASH_STR or any(pattern.fullmatch(single) for pattern in compiled_trash_re)
-        else 0
-        for single in test_case
-    ]
-
-    if all(trash_flag):
-        return ""
+        # Filter interjections at the beginning and end
+        start, end = 0, len(elements)
+        while trash_flag[start] == self.TRASH:
+            start += 1
+        while trash_flag[end - 1] == self.TRASH:
+            end -= 1
+        return "\u3000".join(elements[start:end])
+
+
+DEFAULT_INTERJECTION_CLASSIFIER = InterjectionClassifier()
 
-    # Filter interjections at the beginning and end
-    del_list = [index for index, value in enumerate(trash_flag) if value == 2]
-    delta = len(elements) - len(del_list)
-    elements = [element for index, element in enumerate(elements) if index not in
-                {del_i for i, del_i in enumerate(del_list) if i == del_i or del_i - i == delta}]
 
-    return "\u3000".join(elements)
+def filter_interjections(text, classifier: InterjectionClassifier | None = None) -> str:
+    return (classifier or DEFAULT_INTERJECTION_CLASSIFIER).filter(text)
 
 
 def adjust_repeated_syllables(text, connector: str = "… ") -> str:
     def has_same_syllables(text: str) -> str:
-        syllables = re.findall(r"[あ-んア-ヴ][ゃゅょァィゥェォャュョ]?", text)
+        syllables = SYLLABLE_PATTERN.findall(text)
         if not syllables or "".join(syllables) != text:
             return ""
         if all(kana == syllables[0] for kana in syllables):
@@ -0,0 +1,151 @@
+"""Watching input directories for new subtitle files.
+
+Change notification uses `watchdog` when it is installed. Otherwise directories are polled: a directory
+is listed again when its own modification time changes, and only new or replaced names are checked, so
+idle directories cost one stat each. A periodic full rescan catches arrivals that the directory time
+missed because of its coarse granularity, and files changed in place.
+"""
+import logging
+import os
+import queue
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from .discovery import is_input_file
+
+__all__ = (
+    "DirectoryWatcher",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryWatcher:
+    """Yields input files in the directories once they have finished being written.
+
+    A file counts as finished when its size and modification time stay the same for `settle_time`
+    seconds. A file that changes later is yielded again: with watchdog once it settles, when polling
+    once it is replaced by a new file or the next full rescan, every `rescan_interval` seconds, sees it.
+    """
+
+    def __init__(self, directories: Iterable[Path | str], poll_interval: float = 1.0, settle_time: float = 2.0,
+                 include_existing: bool = True, rescan_interval: float = 30.0):
+        self.directories = [Path(directory) for directory in directories]
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.include_existing = include_existing
+        self.rescan_interval = rescan_interval
+        self._changes: queue.SimpleQueue[Path] = queue.SimpleQueue()
+        self._dir_mtimes: dict[Path, int] = {}
+        self._names: dict[Path, dict[str, int]] = {}  # directory: {name: inode} of its input files
+        self._pending: dict[Path, tuple[int, int, float]] = {}  # path: (size, mtime_ns, unchanged since)
+        self._done: dict[Path, tuple[int, int]] = {}
+        self._observer = None
+
+    def _start_observer(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.info("watchdog is not installed, polling directories instead")
+            return False
+
+        changes = self._changes
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        changes.put(Path(os.fsdecode(path)))
+
+        self._observer = Observer()
+        for directory in self.directories:
+            self._observer.schedule(Handler(), str(directory), recursive=False)
+        self._observer.start()
+        return True
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def _scan(self, directory: Path, full: bool = False) -> None:
+        """Queue new and replaced input files, and with `full` also those changed in place"""
+        try:
+            mtime = directory.stat().st_mtime_ns
+            if not full and self._dir_mtimes.get(directory) == mtime:
+                return
+            with os.scandir(directory) as entries:
+                names = {entry.name: entry.inode() for entry in entries if is_input_file(Path(entry.path))}
+        except FileNotFoundError:
+            return
+        self._dir_mtimes[directory] = mtime
+        known = self._names.get(directory, {})
+        self._names[directory] = names
+        for name in known.keys() - names.keys():
+            self._done.pop(directory / name, None)
+        for name, inode in names.items():
+            path = directory / name
+            if path in self._pending:
+                continue
+            if known.get(name) != inode:
+                self._changes.put(path)
+            elif full:
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                if self._done.get(path) != (stat.st_size, stat.st_mtime_ns):  # Skip files already processed
+                    self._changes.put(path)
+
+    def _check(self, now: float) -> list[Path]:
+        while True:
+            try:
+                path = self._changes.get_nowait()
+            except queue.Empty:
+                break
+            if is_input_file(path):
+                self._pending.setdefault(path, (-1, -1, now))
+
+        ready = []
+        for path, (size, mtime, since) in list(self._pending.items()):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self._pending[path]
+                self._done.pop(path, None)
+                continue
+            if not path.is_file():
+                del self._pending[path]
+            elif (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.settle_time:
+                del self._pending[path]
+                if self._done.get(path) != (size, mtime):
+                    self._done[path] = (size, mtime)
+                    ready.append(path)
+        return sorted(ready)
+
+    def __iter__(self) -> Iterator[Path]:
+        notified = self._start_observer()
+        try:
+            for directory in self.directories:
+                self._scan(directory)
+            if not self.include_existing:
+                self._check(time.monotonic())
+                self._done.update({path: (size, mtime) for path, (size, mtime, _) in self._pending.items()})
+                self._pending.clear()
+            last_rescan = time.monotonic()
+            while True:
+                if not notified:
+                    full = time.monotonic() - last_rescan >= self.rescan_interval
+                    if full:
+                        last_rescan = time.monotonic()
+                    for directory in self.directories:
+                        self._scan(directory, full)
+                yield from self._check(time.monotonic())
+                time.sleep(self.poll_interval)
+        finally:
+            self.stop()